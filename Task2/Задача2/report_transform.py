@@ -0,0 +1,69 @@
+# Columnar CRM merge for bionicpro_etl_daily_report (no Airflow imports,
+# so benchmarks/crm_merge_memory.py can run it directly).
+import numpy as np
+import pandas as pd
+
+UNKNOWN = 'Unknown'
+
+REPORT_COLUMNS = [
+    'report_date', 'user_id', 'user_name', 'prosthesis_model',
+    'avg_signal', 'min_battery', 'total_actions'
+]
+
+def _encode(values):
+    """
+    Categorical-encode a column; the last category is always UNKNOWN and the
+    codes get a trailing UNKNOWN entry, so position -1 (id not found) maps to it.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(UNKNOWN))
+    return np.append(codes, len(uniques)), np.append(uniques.astype(object), UNKNOWN)
+
+class CrmIndex:
+    """
+    Hash index over CRM ids with dictionary-encoded name/model.
+    Built once per run; lookups return codes, not per-row copies of strings.
+    """
+
+    def __init__(self, crm_columns):
+        self.ids = pd.Index(crm_columns['id'])
+        self.name_codes, self.names = _encode(crm_columns['name'])
+        self.model_codes, self.models = _encode(crm_columns['model'])
+
+    def lookup(self, user_ids):
+        pos = self.ids.get_indexer(user_ids)
+        return self.name_codes[pos], self.model_codes[pos]
+
+def transform_columns(crm_columns, telemetry_columns):
+    """
+    Left-join telemetry with CRM column-wise.
+    Inputs are dicts of column lists (as returned by the extract tasks);
+    the result is a dict of NumPy arrays in REPORT_COLUMNS order, ready for
+    a columnar ClickHouse insert.
+    """
+    user_ids = np.asarray(telemetry_columns['user_id'], dtype=object)
+    if len(user_ids) == 0:
+        return None
+
+    crm = CrmIndex(crm_columns)
+    name_codes, model_codes = crm.lookup(user_ids)
+
+    return {
+        'report_date': pd.to_datetime(telemetry_columns['log_date']).values.astype('datetime64[D]'),
+        'user_id': user_ids,
+        # Object arrays referencing the few distinct name/model strings
+        'user_name': crm.names[name_codes],
+        'prosthesis_model': crm.models[model_codes],
+        'avg_signal': np.asarray(telemetry_columns['avg_signal'], dtype=np.float32),
+        'min_battery': np.asarray(telemetry_columns['min_battery'], dtype=np.int32),
+        'total_actions': np.asarray(telemetry_columns['total_actions'], dtype=np.int32),
+    }
+
+def insert_columns(client, columns, table='bionicpro.user_daily_reports'):
+    """Columnar insert straight from the NumPy arrays (no row tuples or dicts)."""
+    client.execute(
+        f'INSERT INTO {table} ({", ".join(REPORT_COLUMNS)}) VALUES',
+        [columns[name] for name in REPORT_COLUMNS],
+        columnar=True,
+        settings={'use_numpy': True}
+    )
+    return len(columns['user_id'])
@@ -0,0 +1,161 @@
+"""
+Thundering-herd test for nginx-cdn.
+
+Uploads fresh objects to MinIO (so the CDN cache is cold), then fires
+`--clients` simultaneous signed requests at each object, followed by a warm
+phase. Reports latency, the CDN hit ratio (X-Cache-Status) and MinIO request
+amplification: GET/HEAD object calls that reached MinIO per cache entry.
+Ideal amplification with proxy_cache_lock is 1.0.
+
+Needs the MinIO S3 API and metrics on the host (benchmarks/docker-compose.bench.yaml):
+
+    python benchmarks/cdn_herd.py --objects 20 --clients 200 --size-kb 64
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import uuid
+from collections import Counter
+
+import httpx
+
+from loadgen import print_summaries, run_load, save_summaries
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bionicpro-auth"))
+
+from cdn_links import sign_cdn_path
+
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://localhost:9002")
+# Not the reports bucket: report-invalidator treats its top-level prefixes as user ids
+S3_BUCKET = os.getenv("CDN_HERD_BUCKET", "cdn-herd")
+# Requires MINIO_PROMETHEUS_AUTH_TYPE=public
+MINIO_METRICS_URL = os.getenv("MINIO_METRICS_URL", f"{S3_ENDPOINT}/minio/v2/metrics/node")
+# Must match `slice` in nginx-cdn/nginx.conf.template
+CDN_SLICE_BYTES = 1024 * 1024
+OBJECT_APIS = ("getobject", "headobject")
+
+
+def s3_client():
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client("s3", endpoint_url=S3_ENDPOINT,
+                        aws_access_key_id=os.getenv("S3_ACCESS_KEY", "minioadmin"),
+                        aws_secret_access_key=os.getenv("S3_SECRET_KEY", "minioadmin"),
+                        config=Config(signature_version="s3v4"), region_name="us-east-1")
+
+
+def ensure_bucket(s3):
+    """Create the bench bucket with anonymous reads, as createbuckets does for `reports` (nginx-cdn fetches unsigned)."""
+    try:
+        s3.head_bucket(Bucket=S3_BUCKET)
+    except s3.exceptions.ClientError:
+        s3.create_bucket(Bucket=S3_BUCKET)
+    s3.put_bucket_policy(Bucket=S3_BUCKET, Policy=json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [{
+            "Effect": "Allow",
+            "Principal": {"AWS": ["*"]},
+            "Action": ["s3:GetObject"],
+            "Resource": [f"arn:aws:s3:::{S3_BUCKET}/*"],
+        }],
+    }))
+
+
+def upload_objects(s3, prefix, count, size_kb):
+    body = ('{"pad": "' + "x" * max(0, size_kb * 1024 - 11) + '"}').encode()
+    keys = [f"{prefix}/obj{i}.json" for i in range(count)]
+    for key in keys:
+        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType="application/json")
+    return keys, len(body)
+
+
+def delete_objects(s3, keys):
+    s3.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True})
+
+
+async def minio_object_requests(client):
+    """Cumulative GET/HEAD object requests served by MinIO, or None if metrics are unavailable."""
+    try:
+        resp = await client.get(MINIO_METRICS_URL)
+        resp.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    total = 0.0
+    for line in resp.text.splitlines():
+        if line.startswith("minio_s3_requests_total{") and any(f'api="{api}"' in line for api in OBJECT_APIS):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run(args):
+    s3 = s3_client()
+    ensure_bucket(s3)
+    prefix = f"herd/{uuid.uuid4().hex[:8]}"
+    keys = [f"{prefix}/obj{i}.json" for i in range(args.objects)]
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    summaries = []
+    try:
+        # Inside the try: a failed upload still removes what it managed to write
+        keys, size = upload_objects(s3, prefix, args.objects, args.size_kb)
+        slices = max(1, math.ceil(size / CDN_SLICE_BYTES))
+        urls = [sign_cdn_path(f"/{S3_BUCKET}/{key}") for key in keys]
+        async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+            for name, items, duration in (
+                # Each object's requests are queued back to back, so all clients hit it at once
+                ("cdn_herd_cold", [url for url in urls for _ in range(args.clients)], None),
+                ("cdn_warm", urls, args.duration),
+            ):
+                statuses = Counter()
+
+                async def fetch(client, url):
+                    resp = await client.get(url)
+                    resp.raise_for_status()
+                    statuses[resp.headers.get("x-cache-status", "NONE")] += 1
+
+                before = await minio_object_requests(client)
+                result = await run_load(name, client, fetch, items, args.clients, duration=duration)
+                # MinIO refreshes node metrics asynchronously
+                await asyncio.sleep(args.metrics_delay)
+                after = await minio_object_requests(client)
+
+                summary = result.summary()
+                served = sum(statuses.values())
+                summary["hit_ratio"] = round(statuses["HIT"] / served, 3) if served else 0.0
+                summary["cache_status"] = dict(statuses)
+                if before is not None and after is not None:
+                    summary["minio_requests"] = int(after - before)
+                    summary["amplification"] = round((after - before) / (len(keys) * slices), 2)
+                summaries.append(summary)
+    finally:
+        if not args.keep:
+            delete_objects(s3, keys)
+
+    print_summaries(summaries)
+    print()
+    print(f"{'scenario':<28}{'hit ratio':>10}{'MinIO reqs':>12}{'amplification':>15}  cache status")
+    for s in summaries:
+        print(f"{s['scenario']:<28}{s['hit_ratio']:>10}{s.get('minio_requests', 'n/a'):>12}"
+              f"{s.get('amplification', 'n/a'):>15}  {s['cache_status']}")
+    if args.output:
+        save_summaries(summaries, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=200, help="simultaneous requests per object")
+    parser.add_argument("--size-kb", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of warm traffic")
+    parser.add_argument("--metrics-delay", type=float, default=2.0)
+    parser.add_argument("--keep", action="store_true", help="keep the uploaded objects")
+    parser.add_argument("--output", help="write summaries as JSON")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
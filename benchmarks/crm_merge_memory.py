@@ -0,0 +1,128 @@
+"""
+Peak-RSS comparison of the report ETL CRM merge: the previous
+DataFrame/records transform vs the columnar one in
+Task2/Задача2/report_transform.py.
+
+Each variant runs in a fresh subprocess on the same synthetic input, so the
+reported peak RSS is not polluted by the other variant.
+
+    python benchmarks/crm_merge_memory.py --rows 2000000 --users 50000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Task2", "Задача2"))
+
+
+def rss_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def synthetic_columns(rows, users, seed):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    crm = {
+        "id": [f"user{i}" for i in range(users)],
+        "name": [f"User {i}" for i in range(users)],
+        "model": [("Hand-X1", "Leg-Y2", "Hand-Z3")[i % 3] for i in range(users)],
+    }
+    # ~1% of telemetry users are missing from CRM
+    uid = rng.integers(0, int(users * 1.01), rows)
+    start = date(2024, 1, 1)
+    telemetry = {
+        "user_id": [f"user{i}" for i in uid],
+        "log_date": [start + timedelta(days=int(d)) for d in rng.integers(0, 365, rows)],
+        "avg_signal": rng.uniform(50, 100, rows).tolist(),
+        "min_battery": rng.integers(0, 100, rows).tolist(),
+        "total_actions": rng.integers(1, 500, rows).tolist(),
+    }
+    return crm, telemetry
+
+
+def legacy_transform(crm_records, telemetry_records):
+    """The transform_data implementation before the columnar rewrite."""
+    import pandas as pd
+
+    df_crm = pd.DataFrame(crm_records)
+    df_telemetry = pd.DataFrame(telemetry_records)
+    df_merged = pd.merge(df_telemetry, df_crm, left_on='user_id', right_on='id', how='left')
+    df_final = df_merged[[
+        'log_date', 'user_id', 'name', 'model', 'avg_signal', 'min_battery', 'total_actions'
+    ]].copy()
+    df_final.rename(columns={'log_date': 'report_date', 'name': 'user_name', 'model': 'prosthesis_model'}, inplace=True)
+    df_final.fillna({'user_name': 'Unknown', 'prosthesis_model': 'Unknown'}, inplace=True)
+    df_final['report_date'] = pd.to_datetime(df_final['report_date']).dt.date
+    return df_final.to_dict('records')
+
+
+def run_variant(args):
+    crm, telemetry = synthetic_columns(args.rows, args.users, args.seed)
+    if args.variant == "legacy":
+        # Previous XCom format: one dict per row
+        crm_in = [dict(zip(crm, values)) for values in zip(*crm.values())]
+        tel_in = [dict(zip(telemetry, values)) for values in zip(*telemetry.values())]
+        del crm, telemetry
+        fn = lambda: legacy_transform(crm_in, tel_in)
+    else:
+        from report_transform import transform_columns
+        crm_in, tel_in = crm, telemetry
+        fn = lambda: transform_columns(crm_in, tel_in)
+
+    baseline = rss_mb("VmRSS")
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    started = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - started
+    peak = rss_mb("VmHWM")
+    print(json.dumps({
+        "variant": args.variant,
+        "rows": args.rows,
+        "wall_s": round(elapsed, 3),
+        "input_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak, 1),
+        "transform_extra_mb": round(peak - baseline, 1),
+        "output_rows": len(out) if isinstance(out, list) else len(out["user_id"]),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--variant", choices=["legacy", "columnar"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args)
+        return
+
+    results = []
+    for variant in ("legacy", "columnar"):
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--variant", variant,
+                                       "--rows", str(args.rows), "--users", str(args.users), "--seed", str(args.seed)])
+        results.append(json.loads(out.decode().strip().splitlines()[-1]))
+
+    print(f"{'variant':<10}{'rows':>10}{'wall s':>10}{'input MB':>10}{'peak MB':>10}{'extra MB':>10}")
+    for r in results:
+        print(f"{r['variant']:<10}{r['rows']:>10}{r['wall_s']:>10}{r['input_rss_mb']:>10}{r['peak_rss_mb']:>10}{r['transform_extra_mb']:>10}")
+    legacy, columnar = results
+    if legacy["transform_extra_mb"] > 0:
+        saved = 1 - columnar["transform_extra_mb"] / legacy["transform_extra_mb"]
+        print(f"Transform memory reduced by {saved:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Standalone harness for the telemetry ETL stages (dags/etl_stages.py).
+
+Runs extract -> transform -> load outside Airflow against a local Postgres
+database and a separate ClickHouse database, on synthetic data generated by
+scripts/seed_sources.py, and records wall time, peak RSS and rows/s per stage.
+
+    # seed 1000 users x 30 days into the etl_bench database, then run
+    python benchmarks/etl_harness.py --seed-users 1000 --days 30
+
+    # re-run on existing data, with cProfile dumps per stage
+    python benchmarks/etl_harness.py --profile prof/
+
+    # sharded ETL (as in the DAG) on a process pool: 8 shards, 4 at a time
+    python benchmarks/etl_harness.py --shards 8 --workers 4
+
+    # incremental run: only days with events ingested since the given time
+    python benchmarks/etl_harness.py --shards 8 --since 2024-02-01T00:00:00
+
+    # whole run under py-spy (needs py-spy installed)
+    python benchmarks/etl_harness.py --flamegraph etl.svg
+"""
+import argparse
+import cProfile
+import functools
+import json
+import os
+import pstats
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "dags"))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+
+import psycopg2
+from clickhouse_driver import Client
+
+import etl_stages
+import seed_sources
+
+BENCH_PG_DB = os.getenv("BENCH_PG_DB", "etl_bench")
+BENCH_CH_DB = os.getenv("BENCH_CH_DB", "bionicpro_bench")
+
+
+def pg_connect(dbname):
+    return psycopg2.connect(host=seed_sources.DB_HOST, port=seed_sources.DB_PORT, dbname=dbname,
+                            user=seed_sources.DB_USER, password=seed_sources.DB_PASS)
+
+
+def prepare_source(args):
+    """Create the bench database and (re)seed it with synthetic telemetry."""
+    admin = pg_connect(seed_sources.DB_NAME)
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (BENCH_PG_DB,))
+    if not cur.fetchone():
+        cur.execute(f"CREATE DATABASE {BENCH_PG_DB}")
+    admin.close()
+
+    if not args.seed_users:
+        return
+    conn = pg_connect(BENCH_PG_DB)
+    conn.autocommit = True
+    cur = conn.cursor()
+    seed_sources.create_tables(cur)
+    cur.execute("TRUNCATE telemetry_logs")
+    user_ids = [f"user{i}" for i in range(1, args.seed_users + 1)]
+    started = time.perf_counter()
+    rows = seed_sources.seed_telemetry(cur, user_ids=user_ids, days=args.days, seed=args.seed)
+    seed_sources.create_telemetry_indexes(cur)
+    conn.close()
+    print(f"Seeded {rows} telemetry rows in {time.perf_counter() - started:.1f}s")
+
+
+def reset_peak_rss():
+    # Linux >= 4.0: resets VmHWM so each stage reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # Fallback: process-lifetime peak (kB on Linux, bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024.0 * 1024.0) if sys.platform == "darwin" else maxrss / 1024.0
+
+
+def run_stage(name, fn, profile_dir=None):
+    reset_peak_rss()
+    profiler = cProfile.Profile() if profile_dir else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    result = fn()
+    if profiler:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+
+    rows = result if isinstance(result, int) else len(result or [])
+    stats = {
+        "stage": name,
+        "rows": rows,
+        "wall_s": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if profiler:
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(path)
+        print(f"--- {name}: top functions (cumulative), full profile in {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    return result, stats
+
+
+def run_pipeline(args):
+    ch = clickhouse_client()
+    etl_stages.ensure_telemetry_table(ch, BENCH_CH_DB)
+    ch.execute(f"TRUNCATE TABLE {BENCH_CH_DB}.telemetry_raw")
+
+    conn = pg_connect(BENCH_PG_DB)
+    results = []
+    extracted, stats = run_stage("extract_telemetry", lambda: etl_stages.extract_telemetry(conn), args.profile)
+    results.append(stats)
+    conn.close()
+
+    transformed, stats = run_stage("transform_telemetry", functools.partial(etl_stages.transform_telemetry, extracted),
+                                     args.profile)
+    results.append(stats)
+    del extracted
+
+    _, stats = run_stage("load_to_clickhouse", lambda: etl_stages.load_telemetry(ch, transformed, BENCH_CH_DB), args.profile)
+    results.append(stats)
+    return results
+
+
+def clickhouse_client():
+    return Client(host=os.getenv("CLICKHOUSE_HOST", "localhost"), port=int(os.getenv("CLICKHOUSE_PORT", 9000)))
+
+
+def _shard_worker(job):
+    conn = pg_connect(BENCH_PG_DB)
+    try:
+        return etl_stages.run_shard(conn, clickhouse_client(), database=BENCH_CH_DB, **job)
+    finally:
+        conn.close()
+
+
+def run_sharded(args):
+    """prepare -> parallel shards -> commit, mirroring the mapped DAG tasks."""
+    ch = clickhouse_client()
+    results = []
+    until = None
+    etl_stages.ensure_telemetry_table(ch, BENCH_CH_DB)
+    if args.since and not etl_stages.telemetry_partitioned(ch, BENCH_CH_DB):
+        print("telemetry_raw is not partitioned by month yet: running a full rebuild instead of --since")
+        args.since = None
+    if args.since:
+        conn = pg_connect(BENCH_PG_DB)
+        until = etl_stages.source_now(conn)
+        conn.close()
+    jobs, stats = run_stage("prepare_shards", lambda: etl_stages.prepare_staging(
+        ch, args.shards, BENCH_CH_DB, since=args.since, until=until))
+    results.append(stats)
+
+    def shards():
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            return sum(pool.map(_shard_worker, jobs))
+
+    # Peak RSS here is the parent only; shard memory lives in the workers
+    _, stats = run_stage(f"etl_shards_x{args.workers}", shards)
+    results.append(stats)
+    if args.since:
+        # rows = number of affected users
+        _, stats = run_stage("merge_telemetry", lambda: etl_stages.merge_staging(ch, args.shards, BENCH_CH_DB))
+    else:
+        _, stats = run_stage("commit_telemetry", lambda: etl_stages.commit_staging(ch, args.shards, BENCH_CH_DB) or 0)
+    results.append(stats)
+    return results
+
+
+def print_results(results):
+    header = f"{'stage':<24}{'rows':>12}{'wall s':>10}{'rows/s':>14}{'peak RSS MB':>14}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['stage']:<24}{r['rows']:>12}{r['wall_s']:>10}{r['rows_per_s']:>14}{r['peak_rss_mb']:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed-users", type=int, default=0, help="reseed the bench source with N users (0 = reuse)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shards", type=int, default=0, help="run the sharded pipeline with N shards")
+    parser.add_argument("--workers", type=int, default=4, help="parallel shard processes (with --shards)")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="with --shards: only recompute days with events ingested since this time")
+    parser.add_argument("--profile", metavar="DIR", help="write cProfile dumps per stage")
+    parser.add_argument("--flamegraph", metavar="SVG", help="re-run under py-spy and write a flamegraph")
+    parser.add_argument("--output", help="write stage stats as JSON")
+    args = parser.parse_args()
+
+    if args.flamegraph:
+        argv = [a for a in sys.argv[1:] if a not in ("--flamegraph", args.flamegraph)]
+        cmd = ["py-spy", "record", "-o", args.flamegraph, "--", sys.executable, os.path.abspath(__file__)] + argv
+        sys.exit(subprocess.call(cmd))
+
+    prepare_source(args)
+    results = run_sharded(args) if args.shards else run_pipeline(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
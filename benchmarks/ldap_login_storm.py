@@ -0,0 +1,213 @@
+"""
+Login storm against Keycloak with LDAP federation, per provisioning profile.
+
+Seeds `--users` accounts into the local OpenLDAP container (ldap/), then for
+every profile in scripts/configure_keycloak.py:LDAP_PROFILES it reconfigures
+the LDAP provider, runs a full sync where the profile uses periodic sync,
+clears the realm user cache and fires concurrent password logins: once per
+user (cold) and then cycled for `--duration` seconds (warm). A profile is a
+good fit when its cold p99 stays close to its warm p99.
+
+Logins use a dedicated `ldap-storm` client with direct access grants (the
+browser flow requires OTP) and a per-run secret (LDAP_STORM_CLIENT_SECRET or
+random). The client and the storm users (in LDAP and their Keycloak copies)
+are deleted when the run ends. Needs Keycloak on :8080 and OpenLDAP on :389:
+
+    python benchmarks/ldap_login_storm.py --users 500 --concurrency 100
+    python benchmarks/ldap_login_storm.py --profiles legacy,cached --output storm.json
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from loadgen import check_regressions, print_summaries, run_load, save_summaries
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import configure_keycloak as kc
+
+LDAP_URL = os.getenv("LDAP_URL", "ldap://localhost:389")
+LDAP_BIND_DN = "cn=admin,dc=example,dc=com"
+LDAP_BIND_PASSWORD = os.getenv("LDAP_ADMIN_PASSWORD", "admin")
+PEOPLE_DN = "ou=People,dc=example,dc=com"
+ROLE_GROUP_DN = "cn=prothetic_user,ou=Groups,dc=example,dc=com"
+USER_PASSWORD = "password"
+STORM_CLIENT = {
+    "clientId": "ldap-storm",
+    "publicClient": False,
+    "secret": os.getenv("LDAP_STORM_CLIENT_SECRET") or secrets.token_urlsafe(24),
+    "standardFlowEnabled": False,
+    "directAccessGrantsEnabled": True,
+}
+TOKEN_URL = f"{kc.KEYCLOAK_URL}/realms/{kc.REALM}/protocol/openid-connect/token"
+
+
+def storm_users(n):
+    return [f"storm{i:05d}" for i in range(n)]
+
+
+def seed_ldap(users):
+    """Add the bench users (idempotent) and put them in the prothetic_user group."""
+    from ldap3 import ALL_ATTRIBUTES, MODIFY_ADD, Connection
+
+    conn = Connection(LDAP_URL, LDAP_BIND_DN, LDAP_BIND_PASSWORD, auto_bind=True)
+    # Paged: OpenLDAP's default size limit is 500 entries
+    found = conn.extend.standard.paged_search(PEOPLE_DN, "(uid=storm*)", attributes=["uid"],
+                                              paged_size=500, generator=False)
+    existing = {entry["attributes"]["uid"][0] for entry in found if entry.get("type") == "searchResEntry"}
+    created = 0
+    for uid in users:
+        if uid in existing:
+            continue
+        conn.add(f"uid={uid},{PEOPLE_DN}", ["inetOrgPerson"], {
+            "cn": uid, "sn": "Storm", "uid": uid,
+            "mail": f"{uid}@example.com", "userPassword": USER_PASSWORD,
+        })
+        created += 1
+    conn.search(ROLE_GROUP_DN, "(objectClass=groupOfNames)", attributes=ALL_ATTRIBUTES)
+    members = set(conn.entries[0].member.values) if conn.entries else set()
+    missing = [f"uid={uid},{PEOPLE_DN}" for uid in users if f"uid={uid},{PEOPLE_DN}" not in members]
+    if missing:
+        conn.modify(ROLE_GROUP_DN, {"member": [(MODIFY_ADD, missing)]})
+    conn.unbind()
+    print(f"LDAP: {created} users created, {len(missing)} added to {ROLE_GROUP_DN}")
+
+
+def unseed_ldap(users):
+    """Remove the bench users from the prothetic_user group and delete their entries."""
+    from ldap3 import MODIFY_DELETE, Connection
+
+    conn = Connection(LDAP_URL, LDAP_BIND_DN, LDAP_BIND_PASSWORD, auto_bind=True)
+    dns = [f"uid={uid},{PEOPLE_DN}" for uid in users]
+    conn.search(ROLE_GROUP_DN, "(objectClass=groupOfNames)", attributes=["member"])
+    members = set(conn.entries[0].member.values) if conn.entries else set()
+    listed = [dn for dn in dns if dn in members]
+    if listed:
+        conn.modify(ROLE_GROUP_DN, {"member": [(MODIFY_DELETE, listed)]})
+    deleted = sum(1 for dn in dns if conn.delete(dn))
+    conn.unbind()
+    print(f"LDAP: {deleted} users deleted, {len(listed)} removed from {ROLE_GROUP_DN}")
+
+
+def delete_keycloak_users(admin, pool, users):
+    """Drop the local copies Keycloak imported from LDAP (they outlive the LDAP entries)."""
+    wanted = set(users)
+    ids = []
+    first = 0
+    while True:
+        page = admin.get("/users", search="storm", briefRepresentation="true", first=first, max=500)
+        ids += [user["id"] for user in page if user["username"] in wanted]
+        if len(page) < 500:
+            break
+        first += len(page)
+
+    def delete(user_id):
+        # 404: already dropped by Keycloak when the LDAP entry went away
+        return admin.session.delete(f"{kc.ADMIN_URL}/users/{user_id}").status_code in (204, 404)
+
+    deleted = sum(pool.map(delete, ids))
+    print(f"Keycloak: {deleted} of {len(ids)} imported storm users deleted")
+
+
+def delete_storm_client(admin):
+    for client in admin.get("/clients", clientId=STORM_CLIENT["clientId"]):
+        admin.write("DELETE", f"/clients/{client['id']}", None, f"client {STORM_CLIENT['clientId']}: delete")
+
+
+def ensure_storm_client(admin):
+    """Create the client with this run's secret (a leftover from an aborted run is replaced)."""
+    delete_storm_client(admin)
+    admin.write("POST", "/clients", STORM_CLIENT, f"client {STORM_CLIENT['clientId']}: create")
+
+
+def apply_profile(admin, profile):
+    """
+    Reconfigure the LDAP provider and start from a cold realm cache. Keys
+    only some profiles set are reset (LDAP_PROFILE_DEFAULTS), so a profile's
+    results do not depend on the profiles that ran before it.
+    """
+    admin.login()  # admin tokens are short-lived, refresh per profile
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        ldap_id = kc.reconcile_ldap(admin, pool, profile)
+    if kc.LDAP_PROFILES[profile]["fullSyncPeriod"] != ["-1"]:
+        print(f"{profile}: {kc.sync_ldap(admin, ldap_id)}")
+    admin.write("POST", "/clear-user-cache", None, f"{profile}: clear user cache")
+
+
+async def login(client, username):
+    resp = await client.post(TOKEN_URL, data={
+        "grant_type": "password",
+        "client_id": STORM_CLIENT["clientId"],
+        "client_secret": STORM_CLIENT["secret"],
+        "username": username,
+        "password": USER_PASSWORD,
+        "scope": "openid",
+    })
+    resp.raise_for_status()
+
+
+async def storm(profile, users, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        cold = await run_load(f"{profile}_cold", client, login, users, args.concurrency)
+        warm = await run_load(f"{profile}_warm", client, login, users, args.concurrency, duration=args.duration)
+    return [cold.summary(), warm.summary()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of warm logins per profile")
+    parser.add_argument("--profiles", default=",".join(kc.LDAP_PROFILES),
+                        help="comma-separated LDAP_PROFILES to compare")
+    parser.add_argument("--restore", default=kc.LDAP_PROFILE, help="profile to leave configured afterwards")
+    parser.add_argument("--output", help="write summaries as JSON")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    profiles = [p for p in args.profiles.split(",") if p]
+    unknown = set(profiles) - set(kc.LDAP_PROFILES)
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+
+    users = storm_users(args.users)
+    admin = kc.Admin()
+    kc.wait_ready(admin.session, 120)
+    admin.login()
+
+    summaries = []
+    try:
+        seed_ldap(users)
+        ensure_storm_client(admin)
+        for profile in profiles:
+            apply_profile(admin, profile)
+            summaries.extend(asyncio.run(storm(profile, users, args)))
+    finally:
+        admin.login()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            kc.reconcile_ldap(admin, pool, args.restore)
+            delete_storm_client(admin)
+            # LDAP first, so Keycloak cannot re-import the users being deleted
+            unseed_ldap(users)
+            delete_keycloak_users(admin, pool, users)
+
+    print_summaries(summaries)
+    if args.output:
+        save_summaries(summaries, args.output)
+    if args.baseline:
+        failures = check_regressions(summaries, args.baseline, args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Minimal async load generator shared by the benchmark scripts.
+
+A scenario is an async callable `make_request(client, item)` that raises on
+failure; `run_load` feeds it work items from `concurrency` workers and
+collects per-request latencies. Requests turned away by admission control
+(429/503 with Retry-After, see `check_response`) are counted as `throttled`,
+apart from errors and latencies.
+"""
+import asyncio
+import json
+import time
+
+
+class Throttled(Exception):
+    """The service shed the request (429/503 with Retry-After)."""
+
+
+def check_response(resp):
+    """raise_for_status(), but a 429/503 carrying Retry-After raises Throttled."""
+    if resp.status_code in (429, 503) and "retry-after" in resp.headers:
+        raise Throttled(f"{resp.status_code}, retry after {resp.headers['retry-after']}s")
+    resp.raise_for_status()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.throttled = 0
+        self.started = None
+        self.finished = None
+
+    def summary(self):
+        values = sorted(self.latencies)
+        elapsed = (self.finished or time.perf_counter()) - (self.started or 0)
+        return {
+            "scenario": self.name,
+            "requests": len(values) + self.errors + self.throttled,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "throughput_rps": round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        }
+
+
+async def run_load(name, client, make_request, items, concurrency, duration=None):
+    """
+    Run `make_request` over `items` with `concurrency` workers.
+    With `duration` (seconds) the items are cycled until time runs out,
+    otherwise every item is requested exactly once.
+    """
+    result = Result(name)
+    items = list(items)
+    if not items:
+        return result
+    position = 0
+    deadline = None
+
+    def next_item():
+        nonlocal position
+        if deadline is None:
+            if position >= len(items):
+                return None
+        elif time.perf_counter() >= deadline:
+            return None
+        item = items[position % len(items)]
+        position += 1
+        return item
+
+    async def worker():
+        while True:
+            item = next_item()
+            if item is None:
+                return
+            started = time.perf_counter()
+            try:
+                await make_request(client, item)
+            except Throttled:
+                result.throttled += 1
+            except Exception:
+                result.errors += 1
+            else:
+                result.latencies.append(time.perf_counter() - started)
+
+    result.started = time.perf_counter()
+    if duration:
+        deadline = result.started + duration
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.finished = time.perf_counter()
+    return result
+
+
+def print_summaries(summaries):
+    header = f"{'scenario':<28}{'reqs':>8}{'errors':>8}{'shed':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(f"{s['scenario']:<28}{s['requests']:>8}{s['errors']:>8}{s.get('throttled', 0):>8}{s['throughput_rps']:>10}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def save_summaries(summaries, path):
+    with open(path, "w") as f:
+        json.dump(summaries, f, indent=2)
+
+
+def check_regressions(summaries, baseline_path, max_regression):
+    """
+    Compare p95/p99 and throughput against a saved run.
+    Returns a list of human-readable failures (empty when within budget).
+    """
+    with open(baseline_path) as f:
+        baseline = {s["scenario"]: s for s in json.load(f)}
+
+    failures = []
+    for s in summaries:
+        base = baseline.get(s["scenario"])
+        if base is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] > 0 and s[key] > base[key] * (1 + max_regression):
+                failures.append(f"{s['scenario']}: {key} {s[key]} > baseline {base[key]}")
+        if base["throughput_rps"] > 0 and s["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            failures.append(f"{s['scenario']}: throughput {s['throughput_rps']} < baseline {base['throughput_rps']}")
+        if s["errors"] > base["errors"]:
+            failures.append(f"{s['scenario']}: errors {s['errors']} > baseline {base['errors']}")
+        # Shed requests are not in the latencies: more of them would hide a slowdown
+        if s.get("throttled", 0) > base.get("throttled", 0):
+            failures.append(f"{s['scenario']}: throttled {s['throttled']} > baseline {base.get('throttled', 0)}")
+    return failures
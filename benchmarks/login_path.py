@@ -0,0 +1,146 @@
+"""
+Load test for the BFF login path against the stub OIDC provider.
+
+Scenarios, each with `--users` distinct users:
+  bff_login            /login -> authorize (stub) -> /callback -> /api/userinfo
+  bff_userinfo_warm    /api/userinfo on live sessions for `--duration` seconds
+  bff_session_refresh  /api/userinfo right after the stub expired every
+                       access token, so each call takes the refresh_token path
+
+Throughput of bff_login is logins/s. For each scenario the provider calls
+(from the stub's /stub/stats) are reported per request.
+
+    # BFF + stub already running (benchmarks/docker-compose.bench.yaml)
+    python benchmarks/login_path.py --users 2000 --concurrency 200
+
+    # start stub_oidc.py and bionicpro-auth locally on :9999 / :8000 first
+    python benchmarks/login_path.py --spawn --users 5000 --concurrency 500 --output login.json
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+from loadgen import check_regressions, print_summaries, run_load, save_summaries
+from report_path import BFF_URL, bff_login
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_OIDC_URL = os.getenv("STUB_OIDC_URL", "http://localhost:9999")
+# The BFF's redirect_uri is fixed to http://localhost:8000/callback
+SPAWN_BFF_PORT = 8000
+SPAWN_STUB_PORT = 9999
+
+
+def spawn_services():
+    """Run the stub provider and the BFF as local processes (needs bionicpro-auth's requirements)."""
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stub_oidc.py"),
+                             "--host", "127.0.0.1", "--port", str(SPAWN_STUB_PORT)])
+    env = dict(os.environ,
+               KEYCLOAK_URL=f"http://127.0.0.1:{SPAWN_STUB_PORT}",
+               KEYCLOAK_EXTERNAL_URL=f"http://localhost:{SPAWN_STUB_PORT}")
+    bff = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                            "--port", str(SPAWN_BFF_PORT), "--log-level", "warning"],
+                           cwd=os.path.join(BENCH_DIR, "..", "bionicpro-auth"), env=env)
+    return [stub, bff]
+
+
+async def wait_ready(client, urls, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{url} not ready after {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def provider_calls(client):
+    resp = await client.get(f"{STUB_OIDC_URL}/stub/stats")
+    resp.raise_for_status()
+    return resp.json()["calls"]
+
+
+async def run(args):
+    users = [f"login_user_{i}" for i in range(args.users)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    # Sessions are passed explicitly per user; the client must not keep a shared cookie jar
+    no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    sessions = {}
+    summaries = []
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits, cookies=no_cookies) as client:
+        await wait_ready(client, [f"{BFF_URL}/metrics", f"{STUB_OIDC_URL}/stub/stats"])
+
+        async def userinfo(client, uid):
+            resp = await client.get(f"{BFF_URL}/api/userinfo", headers={"Cookie": f"session_id={sessions[uid]}"})
+            resp.raise_for_status()
+            # Session ids rotate (session_store.py); keep the current one
+            sessions[uid] = resp.json()["new_session_id"]
+
+        async def login(client, uid):
+            sessions[uid] = await bff_login(client, uid)
+            await userinfo(client, uid)
+
+        async def measure(name, make_request, items, duration=None):
+            before = await provider_calls(client)
+            result = await run_load(name, client, make_request, items, args.concurrency, duration=duration)
+            after = await provider_calls(client)
+            summary = result.summary()
+            served = summary["requests"] - summary["errors"] - summary["throttled"]
+            summary["provider_calls_per_request"] = {
+                key: round((after.get(key, 0) - before.get(key, 0)) / served, 2)
+                for key in sorted(after) if served and after.get(key, 0) != before.get(key, 0)
+            }
+            summaries.append(summary)
+
+        await measure("bff_login", login, users)
+        live = [u for u in users if u in sessions]
+        await measure("bff_userinfo_warm", userinfo, live, duration=args.duration)
+        (await client.post(f"{STUB_OIDC_URL}/stub/expire-access-tokens")).raise_for_status()
+        await measure("bff_session_refresh", userinfo, live)
+
+    print_summaries(summaries)
+    print()
+    for s in summaries:
+        print(f"{s['scenario']:<28}provider calls/request: {s['provider_calls_per_request']}")
+    if args.output:
+        save_summaries(summaries, args.output)
+    if args.baseline:
+        failures = check_regressions(summaries, args.baseline, args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of warm userinfo calls")
+    parser.add_argument("--spawn", action="store_true", help="start stub_oidc.py and the BFF locally")
+    parser.add_argument("--output", help="write summaries as JSON")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    processes = spawn_services() if args.spawn else []
+    try:
+        asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
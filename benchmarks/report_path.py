@@ -0,0 +1,201 @@
+"""
+Load test for the report path.
+
+    # 1. seed N synthetic users into Postgres (scripts/seed_sources.py) and
+    #    simulate the nightly ETL into ClickHouse telemetry_raw
+    python benchmarks/report_path.py seed --users 200 --days 30
+
+    # 2. cold (ClickHouse + S3 upload) vs warm (S3 hit, CDN) report requests
+    python benchmarks/report_path.py run --users 200 --concurrency 32 --output results.json
+
+    # 3. same, plus the BFF path with the stub OIDC provider, gated on a baseline
+    python benchmarks/report_path.py run --bff --baseline baseline.json --max-regression 0.2
+
+The BFF scenario expects bionicpro-auth to talk to benchmarks/stub_oidc.py
+(see benchmarks/docker-compose.bench.yaml).
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import httpx
+
+from loadgen import check_regressions, check_response, print_summaries, run_load, save_summaries
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bionicpro-auth"))
+
+from cdn_links import sign_cdn_path
+
+REPORTS_SERVICE_URL = os.getenv("REPORTS_SERVICE_URL", "http://localhost:8001")
+BFF_URL = os.getenv("BFF_URL", "http://localhost:8000")
+CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "localhost")
+CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", 9000))
+# MinIO S3 API published by docker-compose.bench.yaml
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://localhost:9002")
+S3_BUCKET = os.getenv("S3_BUCKET", "reports")
+BENCH_USER_PREFIX = "bench_user_"
+
+
+def bench_users(n):
+    return [f"{BENCH_USER_PREFIX}{i}" for i in range(n)]
+
+
+def seed(args):
+    """Postgres via seed_sources + the DAG's daily rollup pushed into ClickHouse."""
+    from clickhouse_driver import Client
+    import seed_sources
+
+    users = bench_users(args.users)
+    conn = seed_sources.get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    seed_sources.seed_crm(cursor, users=[
+        (uid, f"Bench {uid}", f"{uid}@example.com", "2023-01-01", "Hand-X1") for uid in users
+    ])
+    seed_sources.seed_telemetry(cursor, user_ids=users, days=args.days)
+
+    # Same aggregation as dags/etl_report.py extract_telemetry_data
+    cursor.execute("""
+        SELECT user_id, date(timestamp) as log_date, avg(signal_strength)::real as avg_signal,
+               min(battery_level) as min_battery, count(action) as total_actions
+        FROM telemetry_logs
+        WHERE user_id LIKE %s
+        GROUP BY user_id, date(timestamp)
+    """, (BENCH_USER_PREFIX + "%",))
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    ch = Client(host=CLICKHOUSE_HOST, port=CLICKHOUSE_PORT)
+    ch.execute(
+        "ALTER TABLE bionicpro.telemetry_raw DELETE WHERE startsWith(user_id, %(prefix)s)",
+        {"prefix": BENCH_USER_PREFIX},
+        settings={"mutations_sync": 1},
+    )
+    ch.execute("INSERT INTO bionicpro.telemetry_raw (user_id, log_date, avg_signal, min_battery, total_actions) VALUES", rows)
+    print(f"Seeded {len(users)} users, {len(rows)} daily rollups.")
+
+
+def drop_cached_reports(users):
+    """Remove S3 report objects so the next request takes the cold path."""
+    import boto3
+    from botocore.client import Config
+
+    s3 = boto3.client("s3", endpoint_url=S3_ENDPOINT,
+                      aws_access_key_id=os.getenv("S3_ACCESS_KEY", "minioadmin"),
+                      aws_secret_access_key=os.getenv("S3_SECRET_KEY", "minioadmin"),
+                      config=Config(signature_version="s3v4"), region_name="us-east-1")
+    for uid in users:
+        listing = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=f"{uid}/")
+        keys = [{"Key": obj["Key"]} for obj in listing.get("Contents", [])]
+        if keys:
+            s3.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": keys})
+
+
+async def bff_login(client, username):
+    """Drive /login -> stub authorize -> /callback; returns the session cookie."""
+    resp = await client.get(f"{BFF_URL}/login")
+    auth_url = resp.headers["location"] + f"&login_hint={username}"
+    resp = await client.get(auth_url)
+    resp = await client.get(resp.headers["location"])
+    session_id = resp.cookies.get("session_id")
+    if not session_id:
+        raise RuntimeError(f"Login failed for {username}: {resp.status_code}")
+    return session_id
+
+
+async def run(args):
+    users = bench_users(args.users)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    summaries = []
+    report_urls = {}
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+
+        async def reports_service_request(client, uid, headers=None):
+            resp = await client.get(f"{REPORTS_SERVICE_URL}/reports/{uid}", headers=headers)
+            check_response(resp)
+            # reports-service returns path + version; links are signed like the BFF does
+            data = resp.json()
+            report_urls[uid] = sign_cdn_path(data["report_path"], data["report_version"])
+
+        async def cdn_request(client, uid):
+            resp = await client.get(report_urls[uid])
+            resp.raise_for_status()
+
+        async def reports_service_cold(client, uid):
+            # no-cache: bypass reports-service's remembered report versions as well
+            await reports_service_request(client, uid, headers={"Cache-Control": "no-cache"})
+
+        drop_cached_reports(users)
+        result = await run_load("reports_service_cold", client, reports_service_cold, users, args.concurrency)
+        summaries.append(result.summary())
+
+        result = await run_load("reports_service_warm", client, reports_service_request, users,
+                                args.concurrency, duration=args.duration)
+        summaries.append(result.summary())
+
+        result = await run_load("cdn_warm", client, cdn_request, [u for u in users if u in report_urls],
+                                args.concurrency, duration=args.duration)
+        summaries.append(result.summary())
+
+        if args.bff:
+            cookies = {}
+
+            async def login(client, uid):
+                cookies[uid] = await bff_login(client, uid)
+
+            # Separate client: login cookies stay out of the shared client's jar
+            async with httpx.AsyncClient(timeout=30.0, limits=limits) as login_client:
+                result = await run_load("bff_login", login_client, login, users, args.concurrency)
+            summaries.append(result.summary())
+
+            async def bff_report(client, uid):
+                resp = await client.get(f"{BFF_URL}/reports", headers={"Cookie": f"session_id={cookies[uid]}"})
+                check_response(resp)
+                cdn = await client.get(resp.json()["report_url"])
+                cdn.raise_for_status()
+
+            result = await run_load("bff_end_to_end_warm", client, bff_report, [u for u in users if u in cookies],
+                                    args.concurrency, duration=args.duration)
+            summaries.append(result.summary())
+
+    print_summaries(summaries)
+    if args.output:
+        save_summaries(summaries, args.output)
+    if args.baseline:
+        failures = check_regressions(summaries, args.baseline, args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="seed synthetic users")
+    p_seed.add_argument("--users", type=int, default=100)
+    p_seed.add_argument("--days", type=int, default=30)
+
+    p_run = sub.add_parser("run", help="run the load test")
+    p_run.add_argument("--users", type=int, default=100)
+    p_run.add_argument("--concurrency", type=int, default=16)
+    p_run.add_argument("--duration", type=float, default=20.0, help="seconds per warm scenario")
+    p_run.add_argument("--bff", action="store_true", help="also drive the BFF (needs stub OIDC)")
+    p_run.add_argument("--output", help="write summaries as JSON")
+    p_run.add_argument("--baseline", help="fail if results regress against this JSON")
+    p_run.add_argument("--max-regression", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
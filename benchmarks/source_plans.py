@@ -0,0 +1,119 @@
+"""
+EXPLAIN checks for the telemetry extract against the Postgres source.
+
+Plans the incremental extract the DAG runs (dags/etl_stages.py: pairs with
+events ingested in a one-day arrival window, recomputed from their source
+rows) and a single user's range, and fails if any of them sequentially scans
+telemetry_logs. The full-rebuild extract and the legacy date(timestamp) = ...
+predicate are planned too, for comparison only (a full rebuild reads
+everything by design).
+
+    # source seeded with indexes (scripts/seed_sources.py, optionally --partitioned)
+    python benchmarks/source_plans.py --day 2024-01-15
+
+    # run the queries too and report actual time / buffers
+    python benchmarks/source_plans.py --day 2024-01-15 --analyze
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "dags"))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+
+import etl_stages
+import seed_sources
+
+USER_RANGE_SQL = """
+    SELECT timestamp, signal_strength, battery_level, action
+    FROM telemetry_logs
+    WHERE user_id = %(user_id)s AND timestamp >= %(start)s AND timestamp < %(end)s
+"""
+
+LEGACY_DAY_SQL = """
+    SELECT user_id, timestamp, signal_strength, battery_level, action
+    FROM telemetry_logs
+    WHERE date(timestamp) = %(start)s
+"""
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(cursor, sql, params, analyze):
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def seq_scanned(plan):
+    """telemetry_logs relations (or partitions) read by a Seq Scan."""
+    return sorted({
+        node["Relation Name"] for node in plan_nodes(plan["Plan"])
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name", "").startswith("telemetry_logs")
+    })
+
+
+def describe(plan):
+    scans = [
+        f"{node['Node Type']} on {node['Relation Name']}" + (f" using {node['Index Name']}" if "Index Name" in node else "")
+        for node in plan_nodes(plan["Plan"]) if "Relation Name" in node
+    ]
+    line = f"cost={plan['Plan']['Total Cost']:.0f}"
+    if "Execution Time" in plan:
+        line += f" time={plan['Execution Time']:.1f}ms rows={plan['Plan']['Actual Rows']}"
+    return line, scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today() - timedelta(days=1))
+    parser.add_argument("--user", default="user1")
+    parser.add_argument("--shards", type=int, default=4, help="also plan shard 0 of N (0 = skip)")
+    parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (executes the queries)")
+    args = parser.parse_args()
+
+    window = {"start": args.day, "end": args.day + timedelta(days=1)}
+    arrivals = {"since": window["start"], "until": window["end"], "shard": None, "num_shards": 1}
+    checks = [
+        ("extract_affected_day", etl_stages.affected_sql(), arrivals, True),
+        ("user_range", USER_RANGE_SQL, {"user_id": args.user, "start": args.day - timedelta(days=7), "end": window["end"]}, True),
+        ("extract_full_rebuild", etl_stages.extract_sql(), {}, False),
+        ("legacy_date_predicate", LEGACY_DAY_SQL, window, False),
+    ]
+    if args.shards:
+        checks.insert(1, ("extract_affected_day_shard", etl_stages.affected_sql(shard=0),
+                          dict(arrivals, shard=0, num_shards=args.shards), True))
+
+    conn = seed_sources.get_connection()
+    cursor = conn.cursor()
+    failures = []
+    for name, sql, params, required in checks:
+        plan = explain(cursor, sql, params, args.analyze)
+        line, scans = describe(plan)
+        print(f"{name}: {line}")
+        for scan in scans:
+            print(f"    {scan}")
+        seq = seq_scanned(plan)
+        if seq and required:
+            failures.append(f"{name}: sequential scan on {', '.join(seq)}")
+    conn.rollback()
+    conn.close()
+
+    for failure in failures:
+        print(f"PLAN CHECK FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
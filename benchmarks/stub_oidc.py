@@ -0,0 +1,134 @@
+"""
+Lightweight OIDC provider stand-in for benchmarks.
+
+Implements the subset of the Keycloak realm endpoints the BFF uses:
+authorization (auto-approves, user taken from `login_hint`), code exchange
+with PKCE S256 verification, refresh_token grant and userinfo.
+State is in memory; nothing is signed.
+
+Bench-only endpoints: GET /stub/stats (calls per endpoint/grant) and
+POST /stub/expire-access-tokens (forces the BFF onto its refresh path).
+
+    python benchmarks/stub_oidc.py --port 9999
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import secrets
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+ACCESS_TOKEN_TTL = int(os.getenv("STUB_ACCESS_TOKEN_TTL", "120"))
+REFRESH_TOKEN_TTL = int(os.getenv("STUB_REFRESH_TOKEN_TTL", "1800"))
+# Artificial latency per call, to emulate a remote Keycloak
+STUB_DELAY_MS = float(os.getenv("STUB_DELAY_MS", "0"))
+
+app = FastAPI()
+
+codes = {}           # code -> {username, redirect_uri, code_challenge}
+access_tokens = {}   # token -> (username, expires_at)
+refresh_tokens = {}  # token -> (username, expires_at)
+stats = Counter()
+
+OIDC_PATH = "/realms/{realm}/protocol/openid-connect"
+
+
+async def delay():
+    if STUB_DELAY_MS:
+        await asyncio.sleep(STUB_DELAY_MS / 1000.0)
+
+
+def issue_tokens(username):
+    now = time.time()
+    access_token = secrets.token_urlsafe(24)
+    refresh_token = secrets.token_urlsafe(24)
+    access_tokens[access_token] = (username, now + ACCESS_TOKEN_TTL)
+    refresh_tokens[refresh_token] = (username, now + REFRESH_TOKEN_TTL)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "Bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+        "refresh_expires_in": REFRESH_TOKEN_TTL,
+        "scope": "openid profile email",
+    }
+
+
+def s256(verifier):
+    digest = hashlib.sha256(verifier.encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+@app.get(OIDC_PATH + "/auth")
+async def authorize(realm: str, redirect_uri: str, state: str, code_challenge: str,
+                    code_challenge_method: str = "S256", login_hint: str = "user1"):
+    if code_challenge_method != "S256":
+        raise HTTPException(status_code=400, detail="Only S256 is supported")
+    stats["authorize"] += 1
+    await delay()
+    code = secrets.token_urlsafe(24)
+    codes[code] = {"username": login_hint, "redirect_uri": redirect_uri, "code_challenge": code_challenge}
+    return RedirectResponse(f"{redirect_uri}?{urlencode({'code': code, 'state': state})}", status_code=302)
+
+
+@app.post(OIDC_PATH + "/token")
+async def token(realm: str, request: Request):
+    form = await request.form()
+    await delay()
+    grant_type = form.get("grant_type")
+    stats[f"token_{grant_type}"] += 1
+
+    if grant_type == "authorization_code":
+        entry = codes.pop(form.get("code"), None)
+        if entry is None or entry["redirect_uri"] != form.get("redirect_uri"):
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        if s256(form.get("code_verifier", "")) != entry["code_challenge"]:
+            return JSONResponse({"error": "invalid_grant", "error_description": "PKCE verification failed"}, status_code=400)
+        return issue_tokens(entry["username"])
+
+    if grant_type == "refresh_token":
+        entry = refresh_tokens.pop(form.get("refresh_token"), None)
+        if entry is None or entry[1] < time.time():
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        return issue_tokens(entry[0])
+
+    return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+
+
+@app.get(OIDC_PATH + "/userinfo")
+async def userinfo(realm: str, request: Request):
+    stats["userinfo"] += 1
+    await delay()
+    auth = request.headers.get("authorization", "")
+    entry = access_tokens.get(auth[len("Bearer "):]) if auth.startswith("Bearer ") else None
+    if entry is None or entry[1] < time.time():
+        return JSONResponse({"error": "invalid_token"}, status_code=401)
+    username = entry[0]
+    return {"sub": username, "preferred_username": username, "email": f"{username}@example.com"}
+
+
+@app.get("/stub/stats")
+async def get_stats():
+    return {"calls": dict(stats), "sessions": len(refresh_tokens)}
+
+
+@app.post("/stub/expire-access-tokens")
+async def expire_access_tokens():
+    for token, (username, _) in access_tokens.items():
+        access_tokens[token] = (username, 0)
+    return {"expired": len(access_tokens)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9999)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
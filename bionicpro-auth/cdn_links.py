@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import os
+import time
+
+# Public CDN address as seen by the browser
+CDN_URL = os.getenv("CDN_URL", "http://localhost:9090")
+# Shared with nginx-cdn (secure_link_md5, templated from the same env var).
+# The only signer: reports-service returns path + version, the BFF signs.
+CDN_SIGNING_SECRET = os.getenv("CDN_SIGNING_SECRET", "bionicpro-cdn-secret")
+CDN_LINK_TTL = int(os.getenv("CDN_LINK_TTL", "300"))
+# How long the BFF trusts a report pointer before asking reports-service again
+REPORT_POINTER_TTL = int(os.getenv("REPORT_POINTER_TTL", "60"))
+
+
+def sign_cdn_path(path, version=None):
+    """
+    Build a short-lived CDN link for `path` (e.g. /reports/user1/2024-01-01.json).
+    Format matches nginx secure_link: md5 = base64url(md5(expires + path + version + " " + secret)).
+    `version` (the object's ETag) is part of the CDN cache key, so a
+    regenerated report gets a fresh cache entry while the others stay warm.
+    """
+    expires = int(time.time()) + CDN_LINK_TTL
+    digest = hashlib.md5(f"{expires}{path}{version or ''} {CDN_SIGNING_SECRET}".encode()).digest()
+    token = base64.urlsafe_b64encode(digest).decode().rstrip("=")
+    url = f"{CDN_URL}{path}?md5={token}&expires={expires}"
+    if version:
+        url += f"&v={version}"
+    return url
+
+
+def etag_matches(if_none_match, version):
+    """Weak If-None-Match comparison (W/ prefixes ignored, as nginx does after gzip)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return "*" in tags or version in tags
+
+
+class ReportPointerCache:
+    """
+    "user_id:granularity" -> (CDN path, version) of the latest generated report.
+    Lets the BFF answer repeated clicks without a reports-service hop.
+    """
+
+    def __init__(self, ttl=REPORT_POINTER_TTL):
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path, version, expires_at = entry
+        if expires_at < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        return path, version
+
+    def put(self, key, path, version=None):
+        self.entries[key] = (path, version, time.monotonic() + self.ttl)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            self.entries.pop(key, None)
@@ -1,15 +1,24 @@
+import logging
 import os
 import secrets
 import uuid
-import requests
-from typing import Optional
+from typing import Literal, Optional
+
+import httpx
 
 from fastapi import FastAPI, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse
-from keycloak import KeycloakOpenID
+
+from oidc_client import KeycloakClient, OIDCError, OIDCUnavailable, calculate_code_challenge
+from reports_client import ReportsClient
+from cdn_links import ReportPointerCache, etag_matches, sign_cdn_path
+from session_store import SessionStore
+from metrics import ERRORS, metrics_middleware, metrics_response, record_cache, require_internal
+from tracing import setup_tracing
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
 
 # Configuration
 KEYCLOAK_URL = os.getenv("KEYCLOAK_URL", "http://keycloak:8080")
@@ -17,8 +26,13 @@ KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM", "reports-realm")
 KEYCLOAK_CLIENT_ID = os.getenv("KEYCLOAK_CLIENT_ID", "reports-frontend")
 KEYCLOAK_CLIENT_SECRET = os.getenv("KEYCLOAK_CLIENT_SECRET", "secret")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
-KEYCLOAK_EXTERNAL_URL = "http://localhost:8080"
-REPORTS_SERVICE_URL = os.getenv("REPORTS_SERVICE_URL", "http://reports-service:8000")
+KEYCLOAK_EXTERNAL_URL = os.getenv("KEYCLOAK_EXTERNAL_URL", "http://localhost:8080")
+
+# Per-route latency histograms (exposed on /metrics)
+app.middleware("http")(metrics_middleware)
+
+# W3C traceparent in, propagated to reports-service and Keycloak
+setup_tracing(app, "bionicpro-auth")
 
 # CORS
 app.add_middleware(
@@ -27,24 +41,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the report version for If-None-Match and throttling back-off
+    expose_headers=["ETag", "Retry-After"],
 )
 
-# Keycloak Client
-keycloak_openid = KeycloakOpenID(
-    server_url=KEYCLOAK_URL + "/",
+# Keycloak Client (async, pooled, with circuit breaker - see oidc_client.py)
+keycloak_openid = KeycloakClient(
+    server_url=KEYCLOAK_URL,
+    external_url=KEYCLOAK_EXTERNAL_URL,
+    realm=KEYCLOAK_REALM,
     client_id=KEYCLOAK_CLIENT_ID,
-    realm_name=KEYCLOAK_REALM,
-    client_secret_key=KEYCLOAK_CLIENT_SECRET,
-    verify=False
+    client_secret=KEYCLOAK_CLIENT_SECRET,
 )
 
-sessions = {}
+# Sessions with throttled id rotation (see session_store.py)
+sessions = SessionStore()
 pkce_storage = {}
 
+# Pooled keep-alive client for reports-service (see reports_client.py)
+reports_client = ReportsClient()
+report_pointers = ReportPointerCache()
+
+@app.on_event("startup")
+async def startup():
+    await keycloak_openid.start()
+    await reports_client.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await keycloak_openid.close()
+    await reports_client.close()
+
 @app.get("/login")
 def login():
     code_verifier = secrets.token_urlsafe(32)
-    code_challenge = keycloak_openid.calculate_code_challenge(code_verifier)
+    code_challenge = calculate_code_challenge(code_verifier)
     state = secrets.token_urlsafe(16)
     pkce_storage[state] = code_verifier
 
@@ -56,30 +87,27 @@ def login():
         code_challenge_method="S256"
     )
 
-    if "keycloak:8080" in auth_url:
-        auth_url = auth_url.replace("keycloak:8080", "localhost:8080")
-
     return RedirectResponse(auth_url)
 
 @app.get("/callback")
-def callback(code: str, state: str, response: Response):
+async def callback(code: str, state: str, response: Response):
     if state not in pkce_storage:
         raise HTTPException(status_code=400, detail="Invalid state")
 
     code_verifier = pkce_storage.pop(state)
 
     try:
-        token_response = keycloak_openid.token(
-            grant_type="authorization_code",
+        token_response = await keycloak_openid.token(
             code=code,
             redirect_uri=f"http://localhost:8000/callback",
             code_verifier=code_verifier
         )
-    except Exception as e:
+    except OIDCUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except OIDCError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    session_id = secrets.token_urlsafe(32)
-    sessions[session_id] = token_response
+    session_id = sessions.create(token_response)
 
     response = RedirectResponse(url=FRONTEND_URL)
     response.set_cookie(
@@ -93,86 +121,155 @@ def callback(code: str, state: str, response: Response):
     return response
 
 @app.get("/api/userinfo")
-def user_info(request: Request, response: Response):
+async def user_info(request: Request, response: Response):
     session_id = request.cookies.get("session_id")
-    if not session_id or session_id not in sessions:
+    session_data = sessions.get(session_id)
+    if session_data is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    session_data = sessions[session_id]
     access_token = session_data["access_token"]
     refresh_token = session_data["refresh_token"]
 
     try:
-        userinfo = keycloak_openid.userinfo(access_token)
-    except Exception:
         try:
-            new_tokens = keycloak_openid.refresh_token(refresh_token)
-            session_data.update(new_tokens)
-            access_token = session_data["access_token"]
-            userinfo = keycloak_openid.userinfo(access_token)
-        except Exception:
-            del sessions[session_id]
-            raise HTTPException(status_code=401, detail="Session expired")
-
-    new_session_id = secrets.token_urlsafe(32)
-    sessions[new_session_id] = session_data
-    del sessions[session_id]
+            userinfo = await keycloak_openid.userinfo(access_token)
+        except OIDCError:
+            try:
+                new_tokens = await keycloak_openid.refresh_token(refresh_token)
+                session_data.update(new_tokens)
+                access_token = session_data["access_token"]
+                userinfo = await keycloak_openid.userinfo(access_token)
+            except OIDCError:
+                sessions.delete(session_id)
+                raise HTTPException(status_code=401, detail="Session expired")
+    except OIDCUnavailable as e:
+        # Keycloak trouble is not the user's fault: keep the session
+        raise HTTPException(status_code=503, detail=str(e))
 
-    response.set_cookie(
-        key="session_id",
-        value=new_session_id,
-        httponly=True,
-        secure=False,
-        samesite="lax",
-        max_age=300
-    )
+    # Rotates at most every SESSION_ROTATE_INTERVAL; cookie is only re-set on change
+    new_session_id = sessions.rotate(session_id)
+    if new_session_id is None:
+        raise HTTPException(status_code=401, detail="Session expired")
+
+    if new_session_id != session_id:
+        response.set_cookie(
+            key="session_id",
+            value=new_session_id,
+            httponly=True,
+            secure=False,
+            samesite="lax",
+            max_age=300
+        )
 
     return {"user": userinfo, "new_session_id": new_session_id}
 
 @app.get("/logout")
 def logout(request: Request, response: Response):
     session_id = request.cookies.get("session_id")
-    if session_id and session_id in sessions:
-        del sessions[session_id]
+    sessions.delete(session_id)
 
     response = RedirectResponse(url=FRONTEND_URL)
     response.delete_cookie("session_id")
     return response
 
+def report_link_response(request: Request, user_id: str, report_path: str, version: str, mode: str):
+    signed_url = sign_cdn_path(report_path, version)
+    if mode == "redirect":
+        return RedirectResponse(signed_url, status_code=302)
+    # ETag is the report content version: an unchanged report costs a 304
+    # and the client keeps the copy it already downloaded from the CDN
+    headers = {"Cache-Control": "private, no-cache"}
+    if version:
+        headers["ETag"] = f'"{version}"'
+        if etag_matches(request.headers.get("if-none-match"), version):
+            return Response(status_code=304, headers=headers)
+    return JSONResponse({"user_id": user_id, "report_url": signed_url}, headers=headers)
+
 @app.get("/reports")
-def get_reports(request: Request):
+async def get_reports(request: Request, mode: str = "json",
+                      granularity: Literal["daily", "weekly", "monthly"] = "daily"):
     """
     Proxy request to Reports Service.
     Enforces security: Uses the authenticated user's ID from session.
+
+    Returns a short-lived signed CDN link (mode=json) or redirects to it
+    (mode=redirect). Known report locations are served from the pointer
+    cache without calling Reports Service. granularity=weekly|monthly asks
+    for the server-side rollup instead of the daily report; other values are
+    rejected (422) before any session, Keycloak or cache work.
     """
     session_id = request.cookies.get("session_id")
-    if not session_id or session_id not in sessions:
+    session_data = sessions.get(session_id)
+    if session_data is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    session_data = sessions[session_id]
-
     # Get User Info to find the ID (sub or preferred_username)
     # We might have cached it, or we fetch it. user_info endpoint fetches it.
     access_token = session_data["access_token"]
     try:
-        userinfo = keycloak_openid.userinfo(access_token)
+        userinfo = await keycloak_openid.userinfo(access_token)
         user_id = userinfo.get("preferred_username") # Or "sub" depending on what we use in DB
         # For our mock seed, we used usernames like "user1", so use preferred_username.
 
         if not user_id:
              raise HTTPException(status_code=400, detail="User ID not found in token")
 
-        # Call Reports Service
+        pointer_key = f"{user_id}:{granularity}"
+        pointer = report_pointers.get(pointer_key)
+        record_cache("report_pointer", pointer is not None)
+        if pointer:
+            return report_link_response(request, user_id, *pointer, mode)
+
+        # Call Reports Service over the shared connection pool
         # We pass user_id in URL. We could also pass a service token if we had inter-service auth.
-        resp = requests.get(f"{REPORTS_SERVICE_URL}/reports/{user_id}")
+        resp = await reports_client.get(f"/reports/{user_id}", params={"granularity": granularity})
 
         if resp.status_code == 200:
-            return resp.json()
+            data = resp.json()
+            report_path = data.get("report_path")
+            if report_path:
+                version = data.get("report_version")
+                report_pointers.put(pointer_key, report_path, version)
+                return report_link_response(request, user_id, report_path, version, mode)
+            return data
         elif resp.status_code == 404:
             return {"message": "Report not found"}
+        elif resp.status_code in (429, 503) and "retry-after" in resp.headers:
+            # Report generation throttled: pass the back-off on to the client
+            raise HTTPException(status_code=resp.status_code, detail="Report generation is busy, retry later",
+                                headers={"Retry-After": resp.headers["retry-after"]})
+        elif resp.status_code == 400:
+            raise HTTPException(status_code=400, detail=resp.json().get("detail", "Bad request"))
         else:
             raise HTTPException(status_code=resp.status_code, detail="Error fetching report")
 
-    except Exception as e:
-        print(f"Error in proxy: {e}")
+    except HTTPException:
+        raise
+    except OIDCError:
+        raise HTTPException(status_code=401, detail="Session expired")
+    except OIDCUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except httpx.TimeoutException as e:
+        ERRORS.labels("proxy_timeout").inc()
+        logger.warning("Reports service timeout: %s", e)
+        raise HTTPException(status_code=504, detail="Reports service timeout")
+    except Exception:
+        ERRORS.labels("proxy").inc()
+        logger.exception("Error in reports proxy")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.post("/internal/report-pointers/{user_id}/invalidate", dependencies=[Depends(require_internal)])
+def invalidate_report_pointers(user_id: str):
+    """Drop the user's report pointers of every granularity (called by report-invalidator)."""
+    report_pointers.invalidate_prefix(f"{user_id}:")
+    return {"user_id": user_id}
+
+@app.get("/internal/proxy-stats", dependencies=[Depends(require_internal)])
+def proxy_stats():
+    """Connection-level counters of the reports-service client."""
+    return reports_client.snapshot()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return metrics_response()
@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import os
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+from metrics import track_dependency
+
+# Configuration
+KEYCLOAK_CONNECT_TIMEOUT = float(os.getenv("KEYCLOAK_CONNECT_TIMEOUT", "1.0"))
+KEYCLOAK_READ_TIMEOUT = float(os.getenv("KEYCLOAK_READ_TIMEOUT", "3.0"))
+KEYCLOAK_POOL_TIMEOUT = float(os.getenv("KEYCLOAK_POOL_TIMEOUT", "1.0"))
+KEYCLOAK_MAX_CONNECTIONS = int(os.getenv("KEYCLOAK_MAX_CONNECTIONS", "50"))
+KEYCLOAK_MAX_KEEPALIVE = int(os.getenv("KEYCLOAK_MAX_KEEPALIVE", "10"))
+# Circuit breaker: open after N consecutive failures, probe again after M seconds
+KEYCLOAK_BREAKER_THRESHOLD = int(os.getenv("KEYCLOAK_BREAKER_THRESHOLD", "5"))
+KEYCLOAK_BREAKER_RESET = float(os.getenv("KEYCLOAK_BREAKER_RESET", "15.0"))
+
+
+class OIDCError(Exception):
+    """Keycloak rejected the request (bad code, expired token, ...)."""
+
+
+class OIDCUnavailable(Exception):
+    """Keycloak is slow, failing or the circuit breaker is open."""
+
+
+def calculate_code_challenge(code_verifier):
+    digest = hashlib.sha256(code_verifier.encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, threshold=KEYCLOAK_BREAKER_THRESHOLD, reset_after=KEYCLOAK_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def end_probe(self):
+        # Probe ended without a verdict (cancelled, unexpected error): let the next call probe
+        self.probing = False
+
+
+class KeycloakClient:
+    """
+    Async OIDC client for the Keycloak realm endpoints used by the BFF
+    (code exchange, refresh, userinfo) over a shared connection pool.
+    """
+
+    def __init__(self, server_url, external_url, realm, client_id, client_secret):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.realm_path = f"/realms/{realm}/protocol/openid-connect"
+        self.server_url = server_url.rstrip("/")
+        # Browser-facing URL for the authorization endpoint
+        self.external_url = external_url.rstrip("/")
+        self.client = None
+        self.breaker = CircuitBreaker()
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.server_url + self.realm_path,
+            timeout=httpx.Timeout(
+                connect=KEYCLOAK_CONNECT_TIMEOUT,
+                read=KEYCLOAK_READ_TIMEOUT,
+                write=KEYCLOAK_READ_TIMEOUT,
+                pool=KEYCLOAK_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=KEYCLOAK_MAX_CONNECTIONS,
+                max_keepalive_connections=KEYCLOAK_MAX_KEEPALIVE,
+            ),
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def auth_url(self, redirect_uri, scope, state, code_challenge, code_challenge_method="S256"):
+        params = {
+            "client_id": self.client_id,
+            "response_type": "code",
+            "redirect_uri": redirect_uri,
+            "scope": scope,
+            "state": state,
+            "code_challenge": code_challenge,
+            "code_challenge_method": code_challenge_method,
+        }
+        return f"{self.external_url}{self.realm_path}/auth?{urlencode(params)}"
+
+    async def token(self, code, redirect_uri, code_verifier):
+        return await self._post_token({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": redirect_uri,
+            "code_verifier": code_verifier,
+        })
+
+    async def refresh_token(self, refresh_token):
+        return await self._post_token({
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        })
+
+    async def userinfo(self, access_token):
+        return await self._call("userinfo", "GET", "/userinfo", headers={"Authorization": f"Bearer {access_token}"})
+
+    async def _post_token(self, data):
+        data = dict(data, client_id=self.client_id, client_secret=self.client_secret)
+        return await self._call(data["grant_type"], "POST", "/token", data=data)
+
+    async def _call(self, operation, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise OIDCUnavailable("Keycloak circuit breaker is open")
+        try:
+            with track_dependency("keycloak", operation):
+                resp = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise OIDCUnavailable(str(e))
+        finally:
+            self.breaker.end_probe()
+
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+            raise OIDCUnavailable(f"Keycloak returned {resp.status_code}")
+
+        # 4xx means Keycloak is healthy and answered; only the request was bad
+        self.breaker.record_success()
+        if resp.status_code >= 400:
+            raise OIDCError(f"{resp.status_code}: {resp.text}")
+        return resp.json()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+
+import httpx
+
+from metrics import track_dependency
+
+# Configuration
+REPORTS_SERVICE_URL = os.getenv("REPORTS_SERVICE_URL", "http://reports-service:8000")
+REPORTS_CONNECT_TIMEOUT = float(os.getenv("REPORTS_CONNECT_TIMEOUT", "1.0"))
+REPORTS_READ_TIMEOUT = float(os.getenv("REPORTS_READ_TIMEOUT", "10.0"))
+REPORTS_POOL_TIMEOUT = float(os.getenv("REPORTS_POOL_TIMEOUT", "1.0"))
+REPORTS_MAX_CONNECTIONS = int(os.getenv("REPORTS_MAX_CONNECTIONS", "100"))
+REPORTS_MAX_KEEPALIVE = int(os.getenv("REPORTS_MAX_KEEPALIVE", "20"))
+REPORTS_KEEPALIVE_EXPIRY = float(os.getenv("REPORTS_KEEPALIVE_EXPIRY", "30.0"))
+REPORTS_HTTP2 = os.getenv("REPORTS_HTTP2", "false").lower() == "true"
+REPORTS_MAX_RETRIES = int(os.getenv("REPORTS_MAX_RETRIES", "2"))
+# Retries may add at most this fraction of extra load on top of regular requests
+REPORTS_RETRY_BUDGET_RATIO = float(os.getenv("REPORTS_RETRY_BUDGET_RATIO", "0.1"))
+REPORTS_RETRY_BUDGET_MIN = int(os.getenv("REPORTS_RETRY_BUDGET_MIN", "10"))
+
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all requests: every request deposits `ratio` tokens,
+    every retry withdraws one. Keeps retries from amplifying an outage.
+    """
+
+    def __init__(self, ratio, min_tokens):
+        self.ratio = ratio
+        self.max_tokens = float(min_tokens)
+        self.tokens = float(min_tokens)
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self):
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ReportsClient:
+    """
+    Shared keep-alive client for BFF -> reports-service calls.
+    One instance per process, opened on startup and closed on shutdown.
+    """
+
+    def __init__(self, base_url=REPORTS_SERVICE_URL):
+        self.base_url = base_url
+        self.client = None
+        self.budget = RetryBudget(REPORTS_RETRY_BUDGET_RATIO, REPORTS_RETRY_BUDGET_MIN)
+        self.stats = {
+            "requests": 0,
+            "responses": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "errors": 0,
+            "latency_seconds_total": 0.0,
+        }
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=REPORTS_HTTP2,
+            timeout=httpx.Timeout(
+                connect=REPORTS_CONNECT_TIMEOUT,
+                read=REPORTS_READ_TIMEOUT,
+                write=REPORTS_READ_TIMEOUT,
+                pool=REPORTS_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=REPORTS_MAX_CONNECTIONS,
+                max_keepalive_connections=REPORTS_MAX_KEEPALIVE,
+                keepalive_expiry=REPORTS_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def get(self, path, **kwargs):
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            self.stats["requests"] += 1
+            started = time.perf_counter()
+            try:
+                with track_dependency("reports-service", "get_report"):
+                    resp = await self.client.get(path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError):
+                # Connection-level failures only; GET is idempotent so a retry is safe
+                self.stats["errors"] += 1
+                if not self._may_retry(attempt):
+                    raise
+            else:
+                self.stats["responses"] += 1
+                self.stats["latency_seconds_total"] += time.perf_counter() - started
+                # Retry-After means load shedding: retrying right away would only add load
+                if (resp.status_code not in RETRYABLE_STATUS or "retry-after" in resp.headers
+                        or not self._may_retry(attempt)):
+                    return resp
+                await resp.aclose()
+
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(0.05 * (2 ** (attempt - 1)))
+
+    def _may_retry(self, attempt):
+        if attempt >= REPORTS_MAX_RETRIES:
+            return False
+        if not self.budget.try_withdraw():
+            self.stats["retries_denied"] += 1
+            return False
+        return True
+
+    def snapshot(self):
+        data = dict(self.stats)
+        data["retry_budget_tokens"] = round(self.budget.tokens, 2)
+        # httpcore pool internals: best effort, the attributes are not public API
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            data["pool_connections"] = len(connections)
+            data["pool_idle_connections"] = sum(1 for c in connections if c.is_idle())
+        return data
@@ -0,0 +1,89 @@
+import os
+import secrets
+import time
+
+# Rotate the session id at most once per this many seconds
+SESSION_ROTATE_INTERVAL = int(os.getenv("SESSION_ROTATE_INTERVAL", "60"))
+# A rotated-out id keeps resolving to the session for this many seconds
+SESSION_ROTATION_GRACE = int(os.getenv("SESSION_ROTATION_GRACE", "10"))
+
+
+class SessionStore:
+    """
+    In-memory session store with throttled id rotation.
+
+    Rotation does not copy session data: the record is re-keyed and the
+    previous id becomes a short-lived alias, so parallel requests that still
+    carry the old cookie are not logged out.
+    """
+
+    def __init__(self, rotate_interval=SESSION_ROTATE_INTERVAL, grace=SESSION_ROTATION_GRACE):
+        self.rotate_interval = rotate_interval
+        self.grace = grace
+        self.sessions = {}
+        # old_id -> (current_id, alias_expires_at)
+        self.aliases = {}
+
+    def create(self, token_data):
+        session_id = secrets.token_urlsafe(32)
+        self.sessions[session_id] = {"tokens": token_data, "rotated_at": time.monotonic()}
+        return session_id
+
+    def resolve(self, session_id):
+        """Return the current id for `session_id` (following a live alias) or None."""
+        if not session_id:
+            return None
+        if session_id in self.sessions:
+            return session_id
+        alias = self.aliases.get(session_id)
+        if alias is None:
+            return None
+        current_id, expires_at = alias
+        if expires_at < time.monotonic() or current_id not in self.sessions:
+            self.aliases.pop(session_id, None)
+            return None
+        return current_id
+
+    def get(self, session_id):
+        current_id = self.resolve(session_id)
+        if current_id is None:
+            return None
+        return self.sessions[current_id]["tokens"]
+
+    def rotate(self, session_id):
+        """
+        Rotate the id if the last rotation is older than the interval.
+        Returns the id the client should use from now on.
+        """
+        current_id = self.resolve(session_id)
+        if current_id is None:
+            return None
+        if current_id != session_id:
+            # Request raced with a rotation; hand out the id it already got
+            return current_id
+
+        record = self.sessions[current_id]
+        now = time.monotonic()
+        if now - record["rotated_at"] < self.rotate_interval:
+            return current_id
+
+        new_id = secrets.token_urlsafe(32)
+        record["rotated_at"] = now
+        self.sessions[new_id] = self.sessions.pop(current_id)
+        self.aliases[current_id] = (new_id, now + self.grace)
+        self._purge_aliases(now)
+        return new_id
+
+    def delete(self, session_id):
+        current_id = self.resolve(session_id)
+        self.aliases.pop(session_id, None)
+        if current_id is not None:
+            self.sessions.pop(current_id, None)
+
+    def _purge_aliases(self, now):
+        expired = [old_id for old_id, (_, expires_at) in self.aliases.items() if expires_at < now]
+        for old_id in expired:
+            del self.aliases[old_id]
+
+    def __contains__(self, session_id):
+        return self.resolve(session_id) is not None
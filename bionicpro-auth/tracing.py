@@ -0,0 +1,40 @@
+import os
+
+from opentelemetry import trace
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+# Configuration
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Collector stand-in: spans are appended as JSON lines unless an OTLP endpoint is set
+OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "/tmp/traces.jsonl")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+tracer = trace.get_tracer("bionicpro-auth")
+
+
+def _exporter():
+    if OTEL_EXPORTER_OTLP_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT.rstrip("/") + "/v1/traces")
+    return ConsoleSpanExporter(
+        out=open(OTEL_TRACES_FILE, "a"),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+
+
+def setup_tracing(app, service_name):
+    """
+    Install the tracer provider, accept W3C traceparent on incoming requests
+    and propagate it on outgoing httpx calls (reports-service, Keycloak).
+    """
+    if not TRACING_ENABLED:
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(provider)
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+    HTTPXClientInstrumentor().instrument()
@@ -2,12 +2,32 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from clickhouse_driver import Client
+from contextlib import closing
+import boto3
+from botocore.client import Config
+import json
+import os
 from datetime import datetime, timedelta
-import pandas as pd
+
+# Stage logic shared with benchmarks/etl_harness.py (dags/ is on the Airflow path)
+import etl_stages
 
 # Configuration
 SOURCE_CONN_ID = "postgres_default"
 CLICKHOUSE_HOST = "clickhouse"
+# Number of parallel hash(user_id) shards; roughly one per available worker slot
+ETL_SHARDS = int(os.getenv("ETL_SHARDS", "4"))
+# Rebuild every rollup instead of only the (user_id, log_date) pairs with new events
+ETL_FULL_REBUILD = os.getenv("ETL_FULL_REBUILD", "0") == "1"
+# Re-scan this much before the watermark: ingested_at is the inserting
+# transaction's start time, so rows can commit after a later-stamped run
+ETL_LATE_OVERLAP_MINUTES = int(os.getenv("ETL_LATE_OVERLAP_MINUTES", "10"))
+
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://minio:9000")
+S3_BUCKET = os.getenv("S3_BUCKET", "reports")
+# When set, affected users go to report-invalidator (which also refreshes nginx-cdn)
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+INVALIDATION_TOPIC = os.getenv("INVALIDATION_TOPIC", "report-invalidations")
 
 default_args = {
     'owner': 'airflow',
@@ -27,75 +47,80 @@ dag = DAG(
     catchup=False
 )
 
-def extract_telemetry_data(**kwargs):
-    pg_hook = PostgresHook(postgres_conn_id=SOURCE_CONN_ID)
-    sql = """
-        SELECT user_id, date(timestamp) as log_date, avg(signal_strength) as avg_signal,
-               min(battery_level) as min_battery, count(action) as total_actions
-        FROM telemetry_logs
-        GROUP BY user_id, date(timestamp)
-    """
-    df = pg_hook.get_pandas_df(sql)
-    return df.to_dict('records')
-
-def transform_telemetry(**kwargs):
-    ti = kwargs['ti']
-    telemetry_data = ti.xcom_pull(task_ids='extract_telemetry')
-
-    if not telemetry_data:
-        return []
-
-    df = pd.DataFrame(telemetry_data)
-
-    # Just format types if needed, no CRM merge here
-    df['log_date'] = pd.to_datetime(df['log_date']).dt.date
-
-    return df.to_dict('records')
-
-def load_to_clickhouse(**kwargs):
-    ti = kwargs['ti']
-    data = ti.xcom_pull(task_ids='transform_telemetry')
-
-    if not data:
-        print("No data to load")
-        return
+def get_s3_client():
+    return boto3.client('s3',
+                        endpoint_url=S3_ENDPOINT,
+                        aws_access_key_id=os.getenv("S3_ACCESS_KEY", "minioadmin"),
+                        aws_secret_access_key=os.getenv("S3_SECRET_KEY", "minioadmin"),
+                        config=Config(signature_version='s3v4'),
+                        region_name='us-east-1')
 
+def prepare_shards(**kwargs):
     client = Client(CLICKHOUSE_HOST)
-
-    # Ensure raw table exists (should be created by init script, but safe to check)
-    client.execute('CREATE DATABASE IF NOT EXISTS bionicpro')
-    client.execute('''
-        CREATE TABLE IF NOT EXISTS bionicpro.telemetry_raw (
-            user_id String,
-            log_date Date,
-            avg_signal Float32,
-            min_battery Int32,
-            total_actions Int32
-        ) ENGINE = MergeTree()
-        ORDER BY (user_id, log_date)
-    ''')
-
-    # Insert raw telemetry
-    client.execute('INSERT INTO bionicpro.telemetry_raw VALUES', data)
+    pg_hook = PostgresHook(postgres_conn_id=SOURCE_CONN_ID)
+    with closing(pg_hook.get_conn()) as conn:
+        until = etl_stages.source_now(conn)
+    kwargs['ti'].xcom_push(key='until', value=until.isoformat())
+
+    watermark = etl_stages.get_watermark(client)
+    since = None
+    # An unpartitioned telemetry_raw (pre-migration) gets one full rebuild first
+    if watermark and not ETL_FULL_REBUILD and etl_stages.telemetry_partitioned(client):
+        since = watermark - timedelta(minutes=ETL_LATE_OVERLAP_MINUTES)
+        print(f"Recomputing days with events ingested since {since}")
+    return etl_stages.prepare_staging(client, ETL_SHARDS, since=since, until=until)
+
+def etl_shard(shard, num_shards, since=None, until=None, **kwargs):
+    pg_hook = PostgresHook(postgres_conn_id=SOURCE_CONN_ID)
+    with closing(pg_hook.get_conn()) as conn:
+        return etl_stages.run_shard(conn, Client(CLICKHOUSE_HOST), shard, num_shards, since=since, until=until)
+
+def commit_telemetry(**kwargs):
+    """Returns the affected user ids (None after a full rebuild)."""
+    jobs = kwargs['ti'].xcom_pull(task_ids='prepare_shards')
+    if jobs and 'since' in jobs[0]:
+        return etl_stages.merge_staging(Client(CLICKHOUSE_HOST), ETL_SHARDS)
+    etl_stages.commit_staging(Client(CLICKHOUSE_HOST), ETL_SHARDS)
+    return None
+
+def invalidate_reports(**kwargs):
+    """Drop the affected users' cached reports, then advance the watermark."""
+    ti = kwargs['ti']
+    users = ti.xcom_pull(task_ids='commit_telemetry')
+    if KAFKA_BOOTSTRAP_SERVERS:
+        from kafka import KafkaProducer
+        producer = KafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+                                 value_serializer=lambda v: json.dumps(v).encode())
+        etl_stages.publish_invalidations(producer, INVALIDATION_TOPIC, users)
+        producer.close()
+    else:
+        etl_stages.invalidate_reports(get_s3_client(), S3_BUCKET, users)
+    until = datetime.fromisoformat(ti.xcom_pull(task_ids='prepare_shards', key='until'))
+    etl_stages.set_watermark(Client(CLICKHOUSE_HOST), until)
 
 t1 = PythonOperator(
-    task_id='extract_telemetry',
-    python_callable=extract_telemetry_data,
+    task_id='prepare_shards',
+    python_callable=prepare_shards,
     dag=dag,
 )
 
-t2 = PythonOperator(
-    task_id='transform_telemetry',
-    python_callable=transform_telemetry,
-    provide_context=True,
+# One mapped task instance per hash(user_id) shard, run in parallel by the executor
+t2 = PythonOperator.partial(
+    task_id='etl_shard',
+    python_callable=etl_shard,
     dag=dag,
-)
+).expand(op_kwargs=t1.output)
 
 t3 = PythonOperator(
-    task_id='load_to_clickhouse',
-    python_callable=load_to_clickhouse,
-    provide_context=True,
+    task_id='commit_telemetry',
+    python_callable=commit_telemetry,
+    dag=dag,
+)
+
+t4 = PythonOperator(
+    task_id='invalidate_reports',
+    python_callable=invalidate_reports,
     dag=dag,
 )
 
-t1 >> t2 >> t3
+t1 >> t2 >> t3 >> t4
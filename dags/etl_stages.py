@@ -0,0 +1,295 @@
+# Stage logic of bionicpro_etl_daily_telemetry without Airflow dependencies,
+# so the same code runs in the DAG and in benchmarks/etl_harness.py.
+from datetime import datetime
+
+import pandas as pd
+
+from rollups import ROLLUP_PROJECTION_SQL, ROLLUP_PROJECTIONS, rollup_statements
+
+EXTRACT_TELEMETRY_SQL = """
+    SELECT user_id, date(timestamp) as log_date, avg(signal_strength) as avg_signal,
+           min(battery_level) as min_battery, count(action) as total_actions
+    FROM telemetry_logs
+    {where}
+    GROUP BY user_id, date(timestamp)
+"""
+
+# Stable user -> shard assignment; the mask keeps hashtext() non-negative
+SHARD_FILTER = "(hashtext(user_id) & 2147483647) %% %(num_shards)s = %(shard)s"
+
+# Late-arriving data: (user_id, log_date) pairs that received events in the
+# arrival window are recomputed from all of their source rows. Both predicates
+# are sargable (ingested_at BRIN, (user_id, timestamp) btree); see
+# benchmarks/source_plans.py
+AFFECTED_TELEMETRY_SQL = """
+    WITH affected AS (
+        SELECT DISTINCT user_id, date(timestamp) AS log_date
+        FROM telemetry_logs
+        WHERE ingested_at >= %(since)s AND ingested_at < %(until)s {shard}
+    )
+    SELECT t.user_id, a.log_date, avg(t.signal_strength) as avg_signal,
+           min(t.battery_level) as min_battery, count(t.action) as total_actions
+    FROM affected a
+    JOIN telemetry_logs t
+      ON t.user_id = a.user_id AND t.timestamp >= a.log_date AND t.timestamp < a.log_date + 1
+    GROUP BY t.user_id, a.log_date
+"""
+
+STAGING_TABLE = 'telemetry_raw_staging'
+STATE_TABLE = 'etl_state'
+WATERMARK = 'telemetry_ingested_at'
+
+def extract_sql(shard=None):
+    where = "WHERE " + SHARD_FILTER if shard is not None else ""
+    return EXTRACT_TELEMETRY_SQL.format(where=where)
+
+def extract_telemetry(conn, shard=None, num_shards=1):
+    """
+    Daily per-user rollup from the source DB (full rebuild), as XCom-friendly records.
+    With `shard` set only users hashed into that shard are extracted.
+    """
+    params = {'shard': shard, 'num_shards': num_shards}
+    df = pd.read_sql(extract_sql(shard), conn, params=params)
+    return df.to_dict('records')
+
+def affected_sql(shard=None):
+    return AFFECTED_TELEMETRY_SQL.format(shard="AND " + SHARD_FILTER if shard is not None else "")
+
+def extract_affected_telemetry(conn, since, until, shard=None, num_shards=1):
+    """
+    Rollups for the (user_id, log_date) pairs that received events with
+    ingested_at in [since, until), recomputed over all events of each pair.
+    """
+    params = {'since': since, 'until': until, 'shard': shard, 'num_shards': num_shards}
+    df = pd.read_sql(affected_sql(shard), conn, params=params)
+    return df.to_dict('records')
+
+def source_now(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT localtimestamp")
+        return cursor.fetchone()[0]
+
+def transform_telemetry(telemetry_data):
+    if not telemetry_data:
+        return []
+
+    df = pd.DataFrame(telemetry_data)
+
+    # Just format types if needed, no CRM merge here
+    df['log_date'] = pd.to_datetime(df['log_date']).dt.date
+
+    return df.to_dict('records')
+
+# Monthly partitions: an incremental run rewrites only the months that
+# received late telemetry (REPLACE PARTITION), not the whole table
+TELEMETRY_PARTITION_KEY = 'toYYYYMM(log_date)'
+
+def telemetry_table_ddl(database, table, if_not_exists=False):
+    projections = ''.join(
+        f',\n            PROJECTION {name} ({ROLLUP_PROJECTION_SQL.format(period=period)})'
+        for name, period in ROLLUP_PROJECTIONS.items()
+    )
+    return f'''
+        CREATE TABLE {'IF NOT EXISTS ' if if_not_exists else ''}{database}.{table} (
+            user_id String,
+            log_date Date,
+            avg_signal Float32,
+            min_battery Int32,
+            total_actions Int32{projections}
+        ) ENGINE = MergeTree()
+        PARTITION BY {TELEMETRY_PARTITION_KEY}
+        ORDER BY (user_id, log_date)
+    '''
+
+def create_telemetry_table(client, database, table):
+    """(Re)create `table` with the telemetry_raw layout (staging and swap tables)."""
+    client.execute(f'DROP TABLE IF EXISTS {database}.{table}')
+    client.execute(telemetry_table_ddl(database, table))
+
+def ensure_telemetry_table(client, database='bionicpro'):
+    # Ensure raw table exists (should be created by init script, but safe to check)
+    client.execute(f'CREATE DATABASE IF NOT EXISTS {database}')
+    client.execute(telemetry_table_ddl(database, 'telemetry_raw', if_not_exists=True))
+    # Tables created before the rollups existed; scripts/init_db.sh runs the same statements
+    for statement in rollup_statements(database):
+        client.execute(statement)
+
+def telemetry_partitioned(client, database='bionicpro'):
+    """False for a telemetry_raw created before monthly partitioning (a full rebuild migrates it)."""
+    rows = client.execute(
+        'SELECT partition_key FROM system.tables WHERE database = %(database)s AND name = %(table)s',
+        {'database': database, 'table': 'telemetry_raw'}
+    )
+    return bool(rows) and rows[0][0] == TELEMETRY_PARTITION_KEY
+
+def table_partitions(client, database, tables):
+    """partition_id -> tables among `tables` that have active parts in it."""
+    rows = client.execute(
+        'SELECT DISTINCT partition_id, table FROM system.parts '
+        'WHERE database = %(database)s AND table IN %(tables)s AND active',
+        {'database': database, 'tables': tuple(tables)}
+    )
+    partitions = {}
+    for partition_id, table in rows:
+        partitions.setdefault(partition_id, []).append(table)
+    return partitions
+
+def ensure_state_table(client, database='bionicpro'):
+    client.execute(f'''
+        CREATE TABLE IF NOT EXISTS {database}.{STATE_TABLE} (
+            name String,
+            value String,
+            updated_at DateTime64(3) DEFAULT now64(3)
+        ) ENGINE = ReplacingMergeTree(updated_at)
+        ORDER BY name
+    ''')
+
+def get_watermark(client, database='bionicpro'):
+    """Source time up to which arrivals have been processed, or None before the first run."""
+    ensure_state_table(client, database)
+    rows = client.execute(
+        f'SELECT argMax(value, updated_at) FROM {database}.{STATE_TABLE} WHERE name = %(name)s HAVING count() > 0',
+        {'name': WATERMARK}
+    )
+    return datetime.fromisoformat(rows[0][0]) if rows else None
+
+def set_watermark(client, value, database='bionicpro'):
+    ensure_state_table(client, database)
+    client.execute(
+        f'INSERT INTO {database}.{STATE_TABLE} (name, value) VALUES',
+        [{'name': WATERMARK, 'value': value.isoformat()}]
+    )
+
+def load_telemetry(client, data, database='bionicpro', table='telemetry_raw'):
+    """Insert transformed rows; returns the number of rows written."""
+    if not data:
+        print("No data to load")
+        return 0
+
+    if table == 'telemetry_raw':
+        ensure_telemetry_table(client, database)
+
+    # Insert raw telemetry
+    client.execute(f'INSERT INTO {database}.{table} VALUES', data)
+    return len(data)
+
+def staging_table(shard):
+    return f'{STAGING_TABLE}_{shard}'
+
+def prepare_staging(client, num_shards, database='bionicpro', since=None, until=None):
+    """
+    Returns the per-shard arguments for the mapped shard tasks.
+    With `since`/`until` the shards only recompute pairs with arrivals in
+    that window; without them they rebuild everything.
+    """
+    ensure_telemetry_table(client, database)
+    window = {}
+    if since is not None:
+        window = {'since': since.isoformat(), 'until': until.isoformat()}
+    return [dict(window, shard=i, num_shards=num_shards) for i in range(num_shards)]
+
+def run_shard(conn, client, shard, num_shards, database='bionicpro', since=None, until=None):
+    """
+    Extract, transform and load one shard into its own staging table.
+    The table is recreated first, so a retried shard does not duplicate rows.
+    """
+    table = staging_table(shard)
+    create_telemetry_table(client, database, table)
+
+    if since is None:
+        records = extract_telemetry(conn, shard, num_shards)
+    else:
+        records = extract_affected_telemetry(conn, since, until, shard, num_shards)
+    data = transform_telemetry(records)
+    rows = load_telemetry(client, data, database, table)
+    print(f"Shard {shard}/{num_shards}: {rows} rows")
+    return rows
+
+def commit_staging(client, num_shards, database='bionicpro'):
+    """
+    Combine the shard tables (partition attach, no data copy) and swap the
+    result in place of telemetry_raw. The new table always has the current
+    layout, so a full rebuild also migrates an older telemetry_raw.
+    """
+    create_telemetry_table(client, database, 'telemetry_raw_new')
+    tables = [staging_table(shard) for shard in range(num_shards)]
+    for partition_id, sources in table_partitions(client, database, tables).items():
+        for table in sources:
+            client.execute(
+                f"ALTER TABLE {database}.telemetry_raw_new ATTACH PARTITION ID '{partition_id}' FROM {database}.{table}"
+            )
+    client.execute(
+        f'RENAME TABLE {database}.telemetry_raw TO {database}.telemetry_raw_old, '
+        f'{database}.telemetry_raw_new TO {database}.telemetry_raw'
+    )
+    client.execute(f'DROP TABLE IF EXISTS {database}.telemetry_raw_old')
+    for shard in range(num_shards):
+        client.execute(f'DROP TABLE IF EXISTS {database}.{staging_table(shard)}')
+
+def merge_staging(client, num_shards, database='bionicpro'):
+    """
+    Replace only the (user_id, log_date) rows present in the shard tables.
+    Each month that received recomputed rows is rebuilt in a side table from
+    its untouched rows plus the staged ones and swapped in with REPLACE
+    PARTITION (atomic per month), so the cost follows the affected months,
+    not the table size. Returns the affected user ids.
+    """
+    if not telemetry_partitioned(client, database):
+        raise RuntimeError('telemetry_raw is not partitioned by month; run a full rebuild first')
+    tables = [staging_table(shard) for shard in range(num_shards)]
+    staged = ' UNION ALL '.join(f'SELECT * FROM {database}.{table}' for table in tables)
+    users = [row[0] for row in client.execute(f'SELECT DISTINCT user_id FROM ({staged})')]
+
+    merge_table = 'telemetry_raw_merge'
+    for partition_id, sources in sorted(table_partitions(client, database, tables).items()):
+        month = int(partition_id)
+        create_telemetry_table(client, database, merge_table)
+        client.execute(f'''
+            INSERT INTO {database}.{merge_table}
+            SELECT * FROM {database}.telemetry_raw
+            WHERE {TELEMETRY_PARTITION_KEY} = {month}
+              AND (user_id, log_date) NOT IN (
+                  SELECT user_id, log_date FROM ({staged}) WHERE {TELEMETRY_PARTITION_KEY} = {month}
+              )
+        ''')
+        for table in sources:
+            client.execute(
+                f"ALTER TABLE {database}.{merge_table} ATTACH PARTITION ID '{partition_id}' FROM {database}.{table}"
+            )
+        client.execute(
+            f"ALTER TABLE {database}.telemetry_raw REPLACE PARTITION ID '{partition_id}' FROM {database}.{merge_table}"
+        )
+        print(f"Replaced partition {partition_id}")
+    client.execute(f'DROP TABLE IF EXISTS {database}.{merge_table}')
+    for table in tables:
+        client.execute(f'DROP TABLE IF EXISTS {database}.{table}')
+    return users
+
+def invalidate_reports(s3, bucket, user_ids=None):
+    """
+    Delete cached report objects ({user_id}/{date}.json) so the reports
+    service regenerates them; user_ids=None clears the whole bucket.
+    """
+    prefixes = [''] if user_ids is None else [f'{user_id}/' for user_id in user_ids]
+    paginator = s3.get_paginator('list_objects_v2')
+    deleted = 0
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+            if keys:
+                s3.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+                deleted += len(keys)
+    print(f"Invalidated {deleted} cached reports")
+    return deleted
+
+def publish_invalidations(producer, topic, user_ids=None, batch_size=1000):
+    """
+    Hand the affected users to report-invalidator (S3 delete + CDN refresh)
+    instead of deleting here; user_ids=None means every cached report.
+    """
+    if user_ids is None:
+        producer.send(topic, {'all': True, 'reason': 'telemetry_rebuild'})
+    else:
+        for i in range(0, len(user_ids), batch_size):
+            producer.send(topic, {'user_ids': user_ids[i:i + batch_size], 'reason': 'telemetry_reload'})
+    producer.flush()
@@ -0,0 +1,63 @@
+# Weekly/monthly report rollups: the only definition. Used by the ETL
+# (etl_stages.ensure_telemetry_table) and, without Airflow or any other
+# dependency, by scripts/init_db.sh:
+#
+#     python3 dags/rollups.py | clickhouse-client --multiquery
+import sys
+
+# Weekly/monthly rollups kept by ClickHouse inside every telemetry_raw part.
+# Projections (not materialized views) because telemetry_raw is replaced by
+# RENAME swaps and ATTACH/REPLACE PARTITION, which an MV would never see;
+# staging tables are created from the same DDL and carry the projections.
+ROLLUP_PROJECTIONS = {
+    'weekly': 'toStartOfWeek(log_date, 1)',
+    'monthly': 'toStartOfMonth(log_date)',
+}
+# Action-weighted signal average: sum of weighted signals / sum of weights
+ROLLUP_SIGNAL_SUM = 'sum(avg_signal * greatest(total_actions, 1))'
+ROLLUP_WEIGHT_SUM = 'sum(greatest(total_actions, 1))'
+ROLLUP_PROJECTION_SQL = f"""
+    SELECT user_id, {{period}},
+           {ROLLUP_SIGNAL_SUM},
+           {ROLLUP_WEIGHT_SUM},
+           min(min_battery),
+           sum(total_actions)
+    GROUP BY user_id, {{period}}
+"""
+# What reports-service reads for ?granularity=weekly|monthly and for the
+# weekly/monthly sections of the daily report. Same period and aggregates as
+# the projections, so ClickHouse answers it from them. The inner aliases
+# differ from the column names (ClickHouse aliases would shadow the columns).
+ROLLUP_VIEW_SQL = f"""
+    CREATE OR REPLACE VIEW {{database}}.user_{{name}}_reports_view AS
+    SELECT user_id, period,
+           signal_sum / weight_sum AS avg_signal,
+           battery_min AS min_battery,
+           actions_sum AS total_actions
+    FROM (
+        SELECT user_id, {{period}} AS period,
+               {ROLLUP_SIGNAL_SUM} AS signal_sum,
+               {ROLLUP_WEIGHT_SUM} AS weight_sum,
+               min(min_battery) AS battery_min,
+               sum(total_actions) AS actions_sum
+        FROM {{database}}.telemetry_raw
+        GROUP BY user_id, period
+    )
+"""
+
+
+def rollup_statements(database='bionicpro'):
+    """DDL adding the projections to telemetry_raw and (re)creating the views; idempotent."""
+    statements = []
+    for name, period in ROLLUP_PROJECTIONS.items():
+        statements.append(
+            f'ALTER TABLE {database}.telemetry_raw ADD PROJECTION IF NOT EXISTS {name} '
+            f'({ROLLUP_PROJECTION_SQL.format(period=period)})'
+        )
+        statements.append(ROLLUP_VIEW_SQL.format(database=database, name=name, period=period))
+    return statements
+
+
+if __name__ == "__main__":
+    database = sys.argv[1] if len(sys.argv) > 1 else 'bionicpro'
+    print(';\n'.join(statement.strip() for statement in rollup_statements(database)) + ';')
@@ -1,16 +1,20 @@
 import React, { useEffect, useState } from 'react';
 import ReportPage from './components/ReportPage';
+import { clearCachedReports } from './reportCache';
 
 const App: React.FC = () => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
+  const [userId, setUserId] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetch('http://localhost:8000/api/userinfo', {
         credentials: 'include'
     })
-    .then(res => {
+    .then(async res => {
       if (res.ok) {
+        const data = await res.json();
+        setUserId(data.user?.preferred_username ?? data.user?.sub ?? null);
         setIsAuthenticated(true);
       } else {
         setIsAuthenticated(false);
@@ -28,7 +32,9 @@ const App: React.FC = () => {
       window.location.href = "http://localhost:8000/login";
   };
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+      // Cached reports must not outlive the session on a shared browser
+      await clearCachedReports();
       window.location.href = "http://localhost:8000/logout";
   };
 
@@ -49,7 +55,7 @@ const App: React.FC = () => {
        <div className="p-4 bg-gray-100 flex justify-end border-b">
            <button onClick={handleLogout} className="text-red-500 hover:text-red-700 font-semibold">Logout</button>
        </div>
-      <ReportPage />
+      <ReportPage userId={userId} />
     </div>
   );
 };
@@ -1,38 +1,81 @@
-import React, { useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
+import { CachedReport, getCachedReport, putCachedReport } from '../reportCache';
+import { ReportData, Resolution, toReportData } from '../reportColumns';
+import { fetchReport } from '../reportWorkerClient';
+import TrendChart from './TrendChart';
+import VirtualTable from './VirtualTable';
 
-interface ReportItem {
-  date: string;
-  avg_signal: number;
-  min_battery: number;
-  total_actions: number;
-}
+const RESOLUTIONS: { key: Resolution; label: string }[] = [
+  { key: 'daily', label: 'Daily' },
+  { key: 'weekly', label: 'Weekly' },
+  { key: 'monthly', label: 'Monthly' },
+];
+// Longer daily histories open on the weekly view
+const MAX_DAILY_DEFAULT = 180;
+
+// W3C trace context: one trace id per "Get Report" click, shared by the BFF and CDN hops
+const randomHex = (bytes: number): string =>
+  Array.from(crypto.getRandomValues(new Uint8Array(bytes)))
+    .map((b) => b.toString(16).padStart(2, '0'))
+    .join('');
 
-interface ReportData {
-  user_id: string;
-  reports: ReportItem[];
+const newTraceparent = (): string => `00-${randomHex(16)}-${randomHex(8)}-01`;
+
+interface ReportPageProps {
+  userId: string | null;
 }
 
-const ReportPage: React.FC = () => {
-  const [loading, setLoading] = useState(false);
+const ReportPage: React.FC<ReportPageProps> = ({ userId }) => {
+  const [loading, setLoading] = useState(false);       // nothing to show yet
+  const [refreshing, setRefreshing] = useState(false); // revalidating the report on screen
   const [error, setError] = useState<string | null>(null);
   const [reportData, setReportData] = useState<ReportData | null>(null);
+  const [resolution, setResolution] = useState<Resolution | null>(null);
+  // Last report with the validators needed to revalidate it (mirrored in IndexedDB)
+  const cached = useRef<CachedReport<ReportData> | null>(null);
+
+  const showReport = useCallback((report: CachedReport<ReportData>, persist: boolean) => {
+    cached.current = report;
+    setReportData(report.data);
+    if (persist && userId) {
+      putCachedReport(userId, report);
+    }
+  }, [userId]);
 
-  const downloadReport = async () => {
+  const loadReport = useCallback(async (background: boolean) => {
+    const setBusy = background ? setRefreshing : setLoading;
     try {
-      setLoading(true);
+      setBusy(true);
       setError(null);
-      setReportData(null);
 
-      // 1. Call BFF
+      const traceparent = newTraceparent();
+      console.log("Report trace: " + traceparent);
+
+      // 1. Call BFF, revalidating the report we already have
+      const headers: Record<string, string> = { traceparent };
+      if (cached.current?.version) {
+        headers['If-None-Match'] = cached.current.version;
+      }
       const response = await fetch(`http://localhost:8000/reports`, {
-        credentials: 'include'
+        credentials: 'include',
+        headers
       });
 
+      if (response.status === 304 && cached.current) {
+        console.log("Report unchanged: " + cached.current.version);
+        return;
+      }
+
       if (!response.ok) {
         if (response.status === 401) {
             window.location.reload();
             return;
         }
+        const retryAfter = response.headers.get('Retry-After');
+        if ((response.status === 429 || response.status === 503) && retryAfter) {
+            // Report generation is throttled; a cached report (if any) stays on screen
+            throw new Error(`Report generation is busy, please retry in ${retryAfter} s`);
+        }
         throw new Error('Failed to fetch report metadata');
       }
 
@@ -41,26 +84,59 @@ const ReportPage: React.FC = () => {
       // 2. Check for CDN URL
       if (data.report_url) {
           console.log("Fetching from CDN: " + data.report_url);
-          const cdnResponse = await fetch(data.report_url);
-          if (!cdnResponse.ok) {
-              throw new Error('Failed to fetch report from CDN');
+          const path = data.report_url.split('?')[0];
+          const cdnHeaders: Record<string, string> = { traceparent };
+          if (cached.current?.cdnEtag && cached.current.path === path) {
+              cdnHeaders['If-None-Match'] = cached.current.cdnEtag;
+          }
+          // Download and JSON parsing run in a Web Worker (see reportWorker.ts)
+          const cdnResponse = await fetchReport(data.report_url, cdnHeaders);
+          const version = response.headers.get('ETag');
+          if (cdnResponse.status === 304 && cached.current) {
+              showReport({ ...cached.current, version: version ?? cached.current.version, savedAt: Date.now() }, true);
+              return;
+          }
+          if (!cdnResponse.data) {
+              throw new Error(cdnResponse.error ?? 'Failed to fetch report from CDN');
           }
-          const cdnData = await cdnResponse.json();
-          setReportData(cdnData);
+          const cdnEtag = cdnResponse.etag;
+          showReport({ version: version ?? cdnEtag ?? path, cdnEtag, path, data: cdnResponse.data, savedAt: Date.now() }, true);
       }
       // Fallback for legacy format
       else if (data.reports) {
-          setReportData(data);
-      } else {
+          setReportData(toReportData(data));
+      } else if (!background) {
           alert(JSON.stringify(data));
       }
 
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An error occurred');
     } finally {
-      setLoading(false);
+      setBusy(false);
     }
-  };
+  }, [showReport]);
+
+  // Right after login: show the cached report at once, then revalidate it
+  // (this also prefetches the report pointer into the BFF cache)
+  useEffect(() => {
+    let cancelled = false;
+    const restore = async () => {
+      const hit = userId ? await getCachedReport<ReportData>(userId) : null;
+      if (cancelled) return;
+      if (hit) {
+        showReport(hit, false);
+      }
+      loadReport(hit !== null);
+    };
+    restore();
+    return () => { cancelled = true; };
+  }, [userId, showReport, loadReport]);
+
+  const daily = reportData?.series.daily;
+  const defaultResolution: Resolution =
+    daily && daily.labels.length > MAX_DAILY_DEFAULT && reportData?.series.weekly ? 'weekly' : 'daily';
+  const shown = resolution && reportData?.series[resolution] ? resolution : defaultResolution;
+  const series = reportData?.series[shown];
 
   return (
     <div className="flex flex-col items-center justify-center min-h-screen bg-gray-100">
@@ -68,13 +144,13 @@ const ReportPage: React.FC = () => {
         <h1 className="text-2xl font-bold mb-6">Usage Reports</h1>
         
         <button
-          onClick={downloadReport}
-          disabled={loading}
+          onClick={() => loadReport(reportData !== null)}
+          disabled={loading || refreshing}
           className={`px-4 py-2 bg-blue-500 text-white rounded hover:bg-blue-600 mb-4 ${
-            loading ? 'opacity-50 cursor-not-allowed' : ''
+            loading || refreshing ? 'opacity-50 cursor-not-allowed' : ''
           }`}
         >
-          {loading ? 'Generating Report...' : 'Get Report'}
+          {loading ? 'Generating Report...' : refreshing ? 'Refreshing...' : 'Get Report'}
         </button>
 
         {error && (
@@ -83,31 +159,26 @@ const ReportPage: React.FC = () => {
           </div>
         )}
 
-        {reportData && (
+        {reportData && series && (
             <div className="mt-6">
-                <h2 className="text-xl font-semibold mb-2">Report for {reportData.user_id}</h2>
-                <div className="overflow-x-auto">
-                    <table className="min-w-full bg-white border border-gray-300">
-                        <thead>
-                            <tr className="bg-gray-200">
-                                <th className="py-2 px-4 border-b">Date</th>
-                                <th className="py-2 px-4 border-b">Avg Signal</th>
-                                <th className="py-2 px-4 border-b">Min Battery</th>
-                                <th className="py-2 px-4 border-b">Actions</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {reportData.reports.map((item, index) => (
-                                <tr key={index} className="hover:bg-gray-100">
-                                    <td className="py-2 px-4 border-b text-center">{item.date}</td>
-                                    <td className="py-2 px-4 border-b text-center">{item.avg_signal.toFixed(2)}</td>
-                                    <td className="py-2 px-4 border-b text-center">{item.min_battery}%</td>
-                                    <td className="py-2 px-4 border-b text-center">{item.total_actions}</td>
-                                </tr>
-                            ))}
-                        </tbody>
-                    </table>
+                <div className="flex items-center justify-between mb-2">
+                    <h2 className="text-xl font-semibold">Report for {reportData.user_id}</h2>
+                    <div className="flex gap-1">
+                        {RESOLUTIONS.filter((r) => reportData.series[r.key]).map((r) => (
+                            <button
+                                key={r.key}
+                                onClick={() => setResolution(r.key)}
+                                className={`px-3 py-1 rounded text-sm ${
+                                    r.key === shown ? 'bg-blue-500 text-white' : 'bg-gray-200 hover:bg-gray-300'
+                                }`}
+                            >
+                                {r.label}
+                            </button>
+                        ))}
+                    </div>
                 </div>
+                <TrendChart series={series} />
+                <VirtualTable series={series} labelHeader={shown === 'daily' ? 'Date' : 'Period start'} />
             </div>
         )}
       </div>
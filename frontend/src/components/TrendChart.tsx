@@ -0,0 +1,51 @@
+import React, { useMemo } from 'react';
+import { Series } from '../reportColumns';
+
+const WIDTH = 800;
+const HEIGHT = 200;
+const PADDING = 24;
+
+interface TrendChartProps {
+  series: Series;
+}
+
+// Signal and battery (both 0..100) over time. Series are newest first, the
+// chart runs oldest -> newest. At most one point per horizontal pixel is drawn.
+const polyline = (values: ArrayLike<number>): string => {
+  const n = values.length;
+  const step = Math.max(1, Math.ceil(n / (WIDTH - 2 * PADDING)));
+  const points: string[] = [];
+  for (let i = n - 1; i >= 0; i -= step) {
+    const x = PADDING + (n > 1 ? ((n - 1 - i) / (n - 1)) * (WIDTH - 2 * PADDING) : 0);
+    const y = HEIGHT - PADDING - (Math.min(100, Math.max(0, values[i])) / 100) * (HEIGHT - 2 * PADDING);
+    points.push(`${x.toFixed(1)},${y.toFixed(1)}`);
+  }
+  return points.join(' ');
+};
+
+const TrendChart: React.FC<TrendChartProps> = ({ series }) => {
+  const signal = useMemo(() => polyline(series.avgSignal), [series]);
+  const battery = useMemo(() => polyline(series.minBattery), [series]);
+  const n = series.labels.length;
+
+  return (
+    <div className="mb-4">
+      <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} className="w-full h-48 bg-gray-50 border border-gray-200">
+        <polyline points={signal} fill="none" stroke="#3b82f6" strokeWidth={1.5} />
+        <polyline points={battery} fill="none" stroke="#f59e0b" strokeWidth={1.5} />
+        {n > 0 && (
+          <>
+            <text x={PADDING} y={HEIGHT - 6} fontSize={11} fill="#6b7280">{series.labels[n - 1]}</text>
+            <text x={WIDTH - PADDING} y={HEIGHT - 6} fontSize={11} fill="#6b7280" textAnchor="end">{series.labels[0]}</text>
+          </>
+        )}
+      </svg>
+      <div className="flex gap-4 text-sm text-gray-600 mt-1">
+        <span className="text-blue-500">&#9632; Avg signal</span>
+        <span className="text-amber-500">&#9632; Min battery %</span>
+      </div>
+    </div>
+  );
+};
+
+export default TrendChart;
@@ -0,0 +1,58 @@
+import React, { useState } from 'react';
+import { Series } from '../reportColumns';
+
+const ROW_HEIGHT = 41;
+const VIEWPORT_HEIGHT = 480;
+const OVERSCAN = 8;
+
+interface VirtualTableProps {
+  series: Series;
+  labelHeader: string;
+}
+
+// Windowed table: only the rows in view (plus a small overscan) are in the DOM,
+// spacer rows keep the scrollbar sized for the full history.
+const VirtualTable: React.FC<VirtualTableProps> = ({ series, labelHeader }) => {
+  const [scrollTop, setScrollTop] = useState(0);
+  const total = series.labels.length;
+
+  const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const last = Math.min(total, Math.ceil((scrollTop + VIEWPORT_HEIGHT) / ROW_HEIGHT) + OVERSCAN);
+  const rows = [];
+  for (let i = first; i < last; i++) {
+    rows.push(
+      <tr key={i} className="hover:bg-gray-100" style={{ height: ROW_HEIGHT }}>
+        <td className="py-2 px-4 border-b text-center">{series.labels[i]}</td>
+        <td className="py-2 px-4 border-b text-center">{series.avgSignal[i].toFixed(2)}</td>
+        <td className="py-2 px-4 border-b text-center">{series.minBattery[i]}%</td>
+        <td className="py-2 px-4 border-b text-center">{series.totalActions[i]}</td>
+      </tr>
+    );
+  }
+
+  return (
+    <div
+      className="overflow-auto border border-gray-300"
+      style={{ maxHeight: VIEWPORT_HEIGHT }}
+      onScroll={(e) => setScrollTop(e.currentTarget.scrollTop)}
+    >
+      <table className="min-w-full bg-white">
+        <thead className="sticky top-0">
+          <tr className="bg-gray-200">
+            <th className="py-2 px-4 border-b">{labelHeader}</th>
+            <th className="py-2 px-4 border-b">Avg Signal</th>
+            <th className="py-2 px-4 border-b">Min Battery</th>
+            <th className="py-2 px-4 border-b">Actions</th>
+          </tr>
+        </thead>
+        <tbody>
+          {first > 0 && <tr style={{ height: first * ROW_HEIGHT }} />}
+          {rows}
+          {last < total && <tr style={{ height: (total - last) * ROW_HEIGHT }} />}
+        </tbody>
+      </table>
+    </div>
+  );
+};
+
+export default VirtualTable;
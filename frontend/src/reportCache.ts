@@ -0,0 +1,101 @@
+// Last downloaded report per user, kept in IndexedDB so the report page can
+// render instantly on the next visit and revalidate in the background.
+//
+// Store "reports" holds report bodies keyed by their version (ETag);
+// store "latest" maps a user to the version shown last.
+
+const DB_NAME = 'bionicpro-reports';
+// 2: report bodies are stored in columnar form (reportColumns.ts)
+const DB_VERSION = 2;
+const REPORTS = 'reports';
+const LATEST = 'latest';
+
+export interface CachedReport<T> {
+  version: string;        // BFF ETag (report content version)
+  cdnEtag: string | null; // CDN ETag of the JSON object
+  path: string;           // CDN path of the object (signed URL without query)
+  data: T;
+  savedAt: number;
+}
+
+let dbPromise: Promise<IDBDatabase> | null = null;
+
+const request = <T>(req: IDBRequest<T>): Promise<T> =>
+  new Promise((resolve, reject) => {
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+
+const openDb = (): Promise<IDBDatabase> => {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, DB_VERSION);
+      req.onupgradeneeded = (event) => {
+        if (event.oldVersion < 1) {
+          req.result.createObjectStore(REPORTS, { keyPath: 'version' });
+          req.result.createObjectStore(LATEST, { keyPath: 'userId' });
+        } else {
+          // Older body format: drop it, reports are re-downloaded on demand
+          req.transaction?.objectStore(REPORTS).clear();
+          req.transaction?.objectStore(LATEST).clear();
+        }
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+    // Private mode / no IndexedDB: behave as an always-empty cache
+    dbPromise.catch(() => { dbPromise = null; });
+  }
+  return dbPromise;
+};
+
+const done = (tx: IDBTransaction): Promise<void> =>
+  new Promise((resolve, reject) => {
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+    tx.onabort = () => reject(tx.error);
+  });
+
+export const getCachedReport = async <T>(userId: string): Promise<CachedReport<T> | null> => {
+  try {
+    const db = await openDb();
+    const tx = db.transaction([LATEST, REPORTS], 'readonly');
+    const latest = await request(tx.objectStore(LATEST).get(userId));
+    if (!latest) return null;
+    return (await request(tx.objectStore(REPORTS).get(latest.version))) ?? null;
+  } catch (err) {
+    console.warn('Report cache unavailable', err);
+    return null;
+  }
+};
+
+export const putCachedReport = async <T>(userId: string, report: CachedReport<T>): Promise<void> => {
+  try {
+    const db = await openDb();
+    const tx = db.transaction([LATEST, REPORTS], 'readwrite');
+    const latest = tx.objectStore(LATEST);
+    const reports = tx.objectStore(REPORTS);
+    const previous = await request(latest.get(userId));
+    // Only the last version per user is kept
+    if (previous && previous.version !== report.version) {
+      reports.delete(previous.version);
+    }
+    reports.put(report);
+    latest.put({ userId, version: report.version });
+    await done(tx);
+  } catch (err) {
+    console.warn('Could not cache report', err);
+  }
+};
+
+export const clearCachedReports = async (): Promise<void> => {
+  try {
+    const db = await openDb();
+    const tx = db.transaction([LATEST, REPORTS], 'readwrite');
+    tx.objectStore(LATEST).clear();
+    tx.objectStore(REPORTS).clear();
+    await done(tx);
+  } catch (err) {
+    console.warn('Could not clear report cache', err);
+  }
+};
@@ -0,0 +1,68 @@
+// Report JSON (as stored on the CDN) and the columnar form the page renders.
+// Typed arrays can be transferred from the parsing worker without a copy.
+
+export interface ReportItem {
+  date: string;
+  avg_signal: number;
+  min_battery: number;
+  total_actions: number;
+}
+
+export interface PeriodItem {
+  period: string;
+  avg_signal: number;
+  min_battery: number;
+  total_actions: number;
+}
+
+export interface ReportJson {
+  user_id: string;
+  reports: ReportItem[];
+  weekly?: PeriodItem[];
+  monthly?: PeriodItem[];
+}
+
+// One resolution of the report, newest first
+export interface Series {
+  labels: string[];
+  avgSignal: Float32Array;
+  minBattery: Int32Array;
+  totalActions: Int32Array;
+}
+
+export type Resolution = 'daily' | 'weekly' | 'monthly';
+
+export interface ReportData {
+  user_id: string;
+  series: Partial<Record<Resolution, Series>>;
+}
+
+type Row = { date?: string; period?: string; avg_signal: number; min_battery: number; total_actions: number };
+
+const toSeries = (rows: Row[]): Series => {
+  const series: Series = {
+    labels: new Array(rows.length),
+    avgSignal: new Float32Array(rows.length),
+    minBattery: new Int32Array(rows.length),
+    totalActions: new Int32Array(rows.length),
+  };
+  rows.forEach((row, i) => {
+    series.labels[i] = row.date ?? row.period ?? '';
+    series.avgSignal[i] = row.avg_signal;
+    series.minBattery[i] = row.min_battery;
+    series.totalActions[i] = row.total_actions;
+  });
+  return series;
+};
+
+export const toReportData = (json: ReportJson): ReportData => {
+  const series: ReportData['series'] = { daily: toSeries(json.reports) };
+  if (json.weekly) series.weekly = toSeries(json.weekly);
+  if (json.monthly) series.monthly = toSeries(json.monthly);
+  return { user_id: json.user_id, series };
+};
+
+export const transferables = (data: ReportData): ArrayBuffer[] =>
+  Object.values(data.series).flatMap((s) =>
+    s ? [s.avgSignal.buffer, s.minBattery.buffer, s.totalActions.buffer] as ArrayBuffer[] : []
+  );
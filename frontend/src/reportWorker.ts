@@ -0,0 +1,36 @@
+// Downloads and parses report JSON off the main thread. Large multi-year
+// reports are turned into typed-array columns here and transferred back.
+import { ReportData, toReportData, transferables } from './reportColumns';
+
+export interface FetchReportRequest {
+  id: number;
+  url: string;
+  headers: Record<string, string>;
+}
+
+export interface FetchReportResponse {
+  id: number;
+  status: number; // 0 on network/parse errors
+  etag: string | null;
+  data?: ReportData;
+  error?: string;
+}
+
+const ctx = globalThis as unknown as Worker;
+
+ctx.onmessage = async (event: MessageEvent<FetchReportRequest>) => {
+  const { id, url, headers } = event.data;
+  try {
+    const response = await fetch(url, { headers });
+    const etag = response.headers.get('ETag');
+    if (!response.ok) {
+      // 304 (cached copy still valid) or an error: no body to parse
+      ctx.postMessage({ id, status: response.status, etag } as FetchReportResponse);
+      return;
+    }
+    const data = toReportData(await response.json());
+    ctx.postMessage({ id, status: response.status, etag, data } as FetchReportResponse, transferables(data));
+  } catch (err) {
+    ctx.postMessage({ id, status: 0, etag: null, error: String(err) } as FetchReportResponse);
+  }
+};
@@ -0,0 +1,25 @@
+import type { FetchReportRequest, FetchReportResponse } from './reportWorker';
+
+let worker: Worker | null = null;
+let nextId = 0;
+const pending = new Map<number, (response: FetchReportResponse) => void>();
+
+const getWorker = (): Worker => {
+  if (!worker) {
+    worker = new Worker(new URL('./reportWorker.ts', import.meta.url));
+    worker.onmessage = (event: MessageEvent<FetchReportResponse>) => {
+      const resolve = pending.get(event.data.id);
+      pending.delete(event.data.id);
+      resolve?.(event.data);
+    };
+  }
+  return worker;
+};
+
+// Fetch + parse a CDN report in the worker; resolves with the status, ETag and columns
+export const fetchReport = (url: string, headers: Record<string, string>): Promise<FetchReportResponse> =>
+  new Promise((resolve) => {
+    const id = nextId++;
+    pending.set(id, resolve);
+    getWorker().postMessage({ id, url, headers } as FetchReportRequest);
+  });
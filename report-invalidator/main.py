@@ -0,0 +1,193 @@
+# Change-feed driven invalidation of cached reports.
+#
+# Consumes the Debezium CRM topic and the report-invalidations topic (published
+# by the telemetry ETL when days are reloaded). For every affected user that has
+# cached reports: delete the S3 objects, drop the report pointers remembered by
+# reports-service and the BFF, regenerate the latest report of every cached
+# granularity through reports-service and refresh the nginx-cdn entries, so the
+# CDN can cache for 24h without serving stale JSON.
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import httpx
+from botocore.client import Config
+from kafka import KafkaConsumer
+
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092")
+CRM_TOPIC = os.getenv("CRM_TOPIC", "crmserver.public.crm_users")
+INVALIDATION_TOPIC = os.getenv("INVALIDATION_TOPIC", "report-invalidations")
+CONSUMER_GROUP = os.getenv("CONSUMER_GROUP", "report-invalidator")
+
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://minio:9000")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minioadmin")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minioadmin")
+S3_BUCKET = os.getenv("S3_BUCKET", "reports")
+
+REPORTS_SERVICE_URL = os.getenv("REPORTS_SERVICE_URL", "http://reports-service:8000")
+BFF_URL = os.getenv("BFF_URL", "http://bionicpro-auth:8000")
+# X-Internal-Token for the /internal/* routes of reports-service and the BFF
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+# Internal nginx-cdn server that refetches from MinIO and overwrites the cache entry
+CDN_REFRESH_URL = os.getenv("CDN_REFRESH_URL", "http://nginx-cdn:8080")
+# Rebuild the latest report right away (keeps the CDN warm) instead of on next request
+REGENERATE = os.getenv("INVALIDATOR_REGENERATE", "1") == "1"
+WORKERS = int(os.getenv("INVALIDATOR_WORKERS", 8))
+# Longest total back-off when reports-service throttles regeneration (429/503 + Retry-After)
+REGENERATE_MAX_WAIT = float(os.getenv("INVALIDATOR_REGENERATE_MAX_WAIT", 30))
+
+s3 = boto3.client('s3',
+                  endpoint_url=S3_ENDPOINT,
+                  aws_access_key_id=S3_ACCESS_KEY,
+                  aws_secret_access_key=S3_SECRET_KEY,
+                  config=Config(signature_version='s3v4'),
+                  region_name='us-east-1')
+http = httpx.Client(timeout=30.0)
+
+ALL_USERS = "*"
+
+
+def users_from_crm_event(key, value):
+    """User ids touched by a Debezium change event (tombstones only carry the key)."""
+    users = set()
+    if value:
+        for image in (value.get("before"), value.get("after")):
+            if image and image.get("id"):
+                users.add(image["id"])
+    elif key and key.get("id"):
+        users.add(key["id"])
+    return users
+
+
+def users_from_invalidation(value):
+    """{"user_ids": [...]} or {"all": true} from the ETL."""
+    if not value:
+        return set()
+    if value.get("all"):
+        return {ALL_USERS}
+    return set(value.get("user_ids", []))
+
+
+def cached_users():
+    paginator = s3.get_paginator('list_objects_v2')
+    users = set()
+    for page in paginator.paginate(Bucket=S3_BUCKET, Delimiter='/'):
+        users.update(prefix['Prefix'].rstrip('/') for prefix in page.get('CommonPrefixes', []))
+    return users
+
+
+def cached_objects(user_id):
+    """(key, version) of the user's report objects; version is the ETag used in CDN links."""
+    paginator = s3.get_paginator('list_objects_v2')
+    return [(obj['Key'], obj['ETag'].strip('"'))
+            for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=f"{user_id}/")
+            for obj in page.get('Contents', [])]
+
+
+def granularity_of(key):
+    """Report granularity from the object key: <user_id>/<date>[.<granularity>].json"""
+    stem = key.rsplit("/", 1)[-1].removesuffix(".json")
+    return stem.partition(".")[2] or "daily"
+
+
+def evict_pointers(user_id):
+    # reports-service and the BFF remember (path, version) for REPORT_VERSION_TTL /
+    # REPORT_POINTER_TTL; without this they keep linking to the deleted objects
+    headers = {"X-Internal-Token": INTERNAL_API_TOKEN}
+    for url in (f"{REPORTS_SERVICE_URL}/internal/reports/{user_id}/invalidate",
+                f"{BFF_URL}/internal/report-pointers/{user_id}/invalidate"):
+        try:
+            http.post(url, headers=headers).raise_for_status()
+        except httpx.HTTPError as e:
+            # Not fatal: the pointer expires after its TTL
+            print(f"Pointer eviction failed for {user_id} ({url}): {e}")
+
+
+def refresh_cdn(key, version):
+    # Same cache key as the signed link (path + v); a deleted object comes back
+    # as a 404 that replaces the cached 200 and expires at once
+    resp = http.get(f"{CDN_REFRESH_URL}/{S3_BUCKET}/{key}", params={"v": version})
+    return resp.status_code
+
+
+def regenerate(user_id, granularity):
+    waited = 0.0
+    while True:
+        # no-cache: skip reports-service's remembered version of the deleted object
+        resp = http.get(f"{REPORTS_SERVICE_URL}/reports/{user_id}", params={"granularity": granularity},
+                        headers={"Cache-Control": "no-cache"})
+        retry_after = resp.headers.get("retry-after")
+        if resp.status_code in (429, 503) and retry_after and waited + float(retry_after) <= REGENERATE_MAX_WAIT:
+            time.sleep(float(retry_after))
+            waited += float(retry_after)
+            continue
+        resp.raise_for_status()
+        return
+
+
+def invalidate_user(user_id):
+    objects = cached_objects(user_id)
+    if not objects:
+        return 0
+    s3.delete_objects(Bucket=S3_BUCKET, Delete={'Objects': [{'Key': k} for k, _ in objects], 'Quiet': True})
+    evict_pointers(user_id)
+
+    if REGENERATE:
+        for granularity in sorted({granularity_of(key) for key, _ in objects}):
+            try:
+                regenerate(user_id, granularity)
+            except httpx.HTTPError as e:
+                # Not fatal: the report is rebuilt on the next request instead
+                print(f"Regeneration failed for {user_id} ({granularity}): {e}")
+
+    # Links issued for the old versions may still be live (CDN_LINK_TTL)
+    for key, version in objects:
+        refresh_cdn(key, version)
+    return len(objects)
+
+
+def invalidate(users, pool):
+    if ALL_USERS in users:
+        users = cached_users()
+    if not users:
+        return
+    invalidated = sum(pool.map(invalidate_user, sorted(users)))
+    print(f"Invalidated {invalidated} cached reports of {len(users)} users")
+
+
+def decode(raw):
+    return json.loads(raw) if raw else None
+
+
+def main():
+    consumer = KafkaConsumer(
+        CRM_TOPIC, INVALIDATION_TOPIC,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=CONSUMER_GROUP,
+        enable_auto_commit=False,
+        auto_offset_reset='latest',
+        key_deserializer=decode,
+        value_deserializer=decode,
+    )
+    print(f"Listening on {CRM_TOPIC}, {INVALIDATION_TOPIC}")
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        while True:
+            batch = consumer.poll(timeout_ms=1000, max_records=500)
+            if not batch:
+                continue
+            users = set()
+            for partition, records in batch.items():
+                for record in records:
+                    if partition.topic == CRM_TOPIC:
+                        users |= users_from_crm_event(record.key, record.value)
+                    else:
+                        users |= users_from_invalidation(record.value)
+            # At-least-once: offsets are committed only after the batch is applied
+            invalidate(users, pool)
+            consumer.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import ADMISSION_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Report generations (ClickHouse scan + S3 upload) started per second, all users
+REPORT_GEN_RATE = float(os.getenv("REPORT_GEN_RATE", "20"))
+REPORT_GEN_BURST = int(os.getenv("REPORT_GEN_BURST", "40"))
+# Per user: one regeneration every 5s on average, two back to back
+REPORT_GEN_USER_RATE = float(os.getenv("REPORT_GEN_USER_RATE", "0.2"))
+REPORT_GEN_USER_BURST = int(os.getenv("REPORT_GEN_USER_BURST", "2"))
+# Generations running at once; the rest wait in a bounded queue
+REPORT_GEN_CONCURRENCY = int(os.getenv("REPORT_GEN_CONCURRENCY", "4"))
+REPORT_GEN_QUEUE = int(os.getenv("REPORT_GEN_QUEUE", "8"))
+REPORT_GEN_QUEUE_TIMEOUT = float(os.getenv("REPORT_GEN_QUEUE_TIMEOUT", "2.0"))
+# Running and queued generations each hold one of the 40 threads of the anyio
+# pool that also serves cache hits; concurrency + queue is capped at this
+REPORT_GEN_THREAD_BUDGET = int(os.getenv("REPORT_GEN_THREAD_BUDGET", "16"))
+# Retry-After for a full queue / queue timeout
+REPORT_GEN_RETRY_AFTER = int(os.getenv("REPORT_GEN_RETRY_AFTER", "2"))
+# Idle per-user buckets are dropped once there are more than this many
+USER_BUCKETS_MAX = 10000
+
+
+class AdmissionRejected(Exception):
+    """Generation not admitted: answer `status` with a Retry-After of `retry_after` seconds."""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """Take a token; returns 0, or the seconds until one is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        self.refill(now)
+        return self.tokens >= self.burst
+
+
+class AdmissionController:
+    """
+    Guards the report generation path (cache hits never get here):
+      - per user: token bucket, and one generation in flight  -> 429
+      - global: token bucket, `concurrency` slots and a bounded
+        FIFO-ish wait queue with a timeout                     -> 503
+    Both answers carry Retry-After. A rate of 0 disables that bucket.
+    Thread-safe: the report endpoint runs in FastAPI's thread pool. Waiters
+    block a pool thread, so concurrency + queue stays within `thread_budget`
+    and the rest of the pool is left to cache hits.
+    """
+
+    def __init__(self, rate=REPORT_GEN_RATE, burst=REPORT_GEN_BURST,
+                 user_rate=REPORT_GEN_USER_RATE, user_burst=REPORT_GEN_USER_BURST,
+                 concurrency=REPORT_GEN_CONCURRENCY, queue_size=REPORT_GEN_QUEUE,
+                 queue_timeout=REPORT_GEN_QUEUE_TIMEOUT, retry_after=REPORT_GEN_RETRY_AFTER,
+                 thread_budget=REPORT_GEN_THREAD_BUDGET):
+        concurrency = max(1, min(concurrency, thread_budget))
+        if concurrency + queue_size > thread_budget:
+            logger.warning("REPORT_GEN_QUEUE=%d capped to %d (REPORT_GEN_THREAD_BUDGET=%d)",
+                           queue_size, thread_budget - concurrency, thread_budget)
+            queue_size = thread_budget - concurrency
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.user_buckets = {}
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.in_flight_users = set()
+
+    def _reject(self, status, retry_after, reason):
+        ADMISSION_EVENTS.labels(reason).inc()
+        raise AdmissionRejected(status, retry_after, reason)
+
+    def _user_bucket(self, user_id, now):
+        if self.user_rate <= 0:
+            return None
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            if len(self.user_buckets) >= USER_BUCKETS_MAX:
+                self.user_buckets = {u: b for u, b in self.user_buckets.items() if not b.full(now)}
+            bucket = self.user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+        return bucket
+
+    def _acquire(self, user_id):
+        with self.cond:
+            now = time.monotonic()
+            # Capacity before rates: a request turned away here spends no tokens
+            if user_id in self.in_flight_users:
+                self._reject(429, self.retry_after, "user_in_flight")
+            if self.active >= self.concurrency and self.waiting >= self.queue_size:
+                self._reject(503, self.retry_after, "queue_full")
+            user_bucket = self._user_bucket(user_id, now)
+            wait = user_bucket.take(now) if user_bucket else 0.0
+            if wait:
+                self._reject(429, wait, "user_rate")
+            wait = self.bucket.take(now) if self.bucket else 0.0
+            if wait:
+                if user_bucket:
+                    user_bucket.refund()
+                self._reject(503, wait, "global_rate")
+
+            if self.active >= self.concurrency:
+                self.waiting += 1
+                self.in_flight_users.add(user_id)
+                deadline = now + self.queue_timeout
+                try:
+                    while self.active >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.in_flight_users.discard(user_id)
+                            # Nothing was generated: give the tokens back
+                            for bucket in (user_bucket, self.bucket):
+                                if bucket:
+                                    bucket.refund()
+                            self._reject(503, self.retry_after, "queue_timeout")
+                        self.cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            self.active += 1
+            self.in_flight_users.add(user_id)
+            ADMISSION_EVENTS.labels("admitted").inc()
+
+    def _release(self, user_id):
+        with self.cond:
+            self.active -= 1
+            self.in_flight_users.discard(user_id)
+            self.cond.notify()
+
+    @contextmanager
+    def admit(self, user_id):
+        self._acquire(user_id)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def snapshot(self):
+        with self.cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "global_tokens": round(self.bucket.tokens, 2) if self.bucket else None,
+                "user_buckets": len(self.user_buckets),
+            }
@@ -1,12 +1,27 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from clickhouse_driver import Client
 import boto3
 from botocore.client import Config
 import os
 import json
-from datetime import datetime
+import logging
+import time
+import base64
+import hashlib
+
+from admission import AdmissionController, AdmissionRejected
+from metrics import ERRORS, metrics_middleware, metrics_response, record_cache, require_internal, track_dependency
+from tracing import clickhouse_query_id, setup_tracing
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Per-route latency histograms (exposed on /metrics)
+app.middleware("http")(metrics_middleware)
+
+# Continue the trace started by the BFF (W3C traceparent)
+setup_tracing(app, "reports-service")
 
 CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "clickhouse")
 CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", 9000))
@@ -15,7 +30,19 @@ S3_ENDPOINT = os.getenv("S3_ENDPOINT", "http://minio:9000")
 S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minioadmin")
 S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minioadmin")
 S3_BUCKET = os.getenv("S3_BUCKET", "reports")
-CDN_URL = os.getenv("CDN_URL", "http://localhost:9090")
+# How long a known (report key, version) is trusted without ClickHouse / head_object
+REPORT_VERSION_TTL = int(os.getenv("REPORT_VERSION_TTL", 60))
+
+# (user_id, granularity) -> (report_key, version, expires_at)
+report_versions = {}
+
+# Limits on cache-miss generations (see admission.py)
+admission = AdmissionController()
+
+# Coarser report granularities: bionicpro.user_<granularity>_reports_view,
+# answered from the aggregate projections of bionicpro.telemetry_raw. Both
+# are defined in dags/rollups.py (applied by scripts/init_db.sh and the ETL).
+GRANULARITIES = ("weekly", "monthly")
 
 def get_clickhouse_client():
     return Client(host=CLICKHOUSE_HOST, port=CLICKHOUSE_PORT)
@@ -28,66 +55,175 @@ def get_s3_client():
                         config=Config(signature_version='s3v4'),
                         region_name='us-east-1')
 
+def content_etag(body):
+    """Content hash used as the report version; equals the S3/CDN ETag of a single PUT."""
+    return hashlib.md5(body).hexdigest()
+
+def remember_version(user_id, granularity, report_key, version):
+    """
+    Only after head_object/put_object: the TTL counts from the last check
+    against S3, hits served from this cache never extend it.
+    """
+    report_versions[(user_id, granularity)] = (report_key, version, time.monotonic() + REPORT_VERSION_TTL)
+
+def report_response(user_id, report_key, version):
+    """
+    CDN path and version of the report. Links are signed (and If-None-Match
+    answered) by the BFF only, see bionicpro-auth/cdn_links.py.
+    """
+    return JSONResponse({
+        "user_id": user_id,
+        "report_path": f"/{S3_BUCKET}/{report_key}",
+        "report_version": version,
+    }, headers={"ETag": f'"{version}"'})
+
+def known_version(request, user_id, granularity):
+    """Recently seen report, unless the caller asks to bypass it (Cache-Control: no-cache)."""
+    if "no-cache" in request.headers.get("cache-control", ""):
+        return None
+    entry = report_versions.get((user_id, granularity))
+    if entry is None or entry[2] < time.monotonic():
+        return None
+    return entry
+
+def query_rollup(ch_client, user_id, granularity):
+    """Weekly/monthly rows read from the projection: cost follows periods, not days."""
+    with track_dependency("clickhouse", f"report_{granularity}") as span:
+        result = ch_client.execute(
+            f"""
+            SELECT period, avg_signal, min_battery, total_actions
+            FROM bionicpro.user_{granularity}_reports_view
+            WHERE user_id = %(user_id)s
+            ORDER BY period DESC
+            """,
+            {'user_id': user_id},
+            query_id=clickhouse_query_id(span)
+        )
+    return [
+        {"period": str(row[0]), "avg_signal": row[1], "min_battery": row[2], "total_actions": row[3]}
+        for row in result
+    ]
+
+def build_daily_report(ch_client, user_id):
+    # Using VIEW
+    with track_dependency("clickhouse", "report") as span:
+        result = ch_client.execute(
+            """
+            SELECT report_date, avg_signal, min_battery, total_actions
+            FROM bionicpro.user_daily_reports_view
+            WHERE user_id = %(user_id)s
+            ORDER BY report_date DESC
+            """,
+            {'user_id': user_id},
+            query_id=clickhouse_query_id(span)
+        )
+
+    reports = []
+    for row in result:
+        reports.append({
+            "date": str(row[0]),
+            "avg_signal": row[1],
+            "min_battery": row[2],
+            "total_actions": row[3]
+        })
+
+    return {
+        "user_id": user_id,
+        "reports": reports,
+        # Same server-side rollups as ?granularity=weekly|monthly, so long
+        # histories chart without client-side aggregation
+        "weekly": query_rollup(ch_client, user_id, "weekly"),
+        "monthly": query_rollup(ch_client, user_id, "monthly"),
+    }
+
 @app.get("/reports/{user_id}")
-def get_user_report(user_id: str, request: Request):
+def get_user_report(user_id: str, request: Request, granularity: str = "daily"):
+
+    if granularity != "daily" and granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown granularity: {granularity}")
+
+    known = known_version(request, user_id, granularity)
+    record_cache("report_version", known is not None)
+    if known:
+        return report_response(user_id, known[0], known[1])
 
     # 1. Determine "latest" available date
     try:
         ch_client = get_clickhouse_client()
         # Querying the VIEW now: bionicpro.user_daily_reports_view
-        result_date = ch_client.execute(
-            "SELECT max(report_date) FROM bionicpro.user_daily_reports_view WHERE user_id = %(user_id)s",
-            {'user_id': user_id}
-        )
+        with track_dependency("clickhouse", "latest_date") as span:
+            result_date = ch_client.execute(
+                "SELECT max(report_date) FROM bionicpro.user_daily_reports_view WHERE user_id = %(user_id)s",
+                {'user_id': user_id},
+                query_id=clickhouse_query_id(span)
+            )
         if not result_date or not result_date[0][0]:
              return {"message": "No reports found for this user."}
 
         latest_date = result_date[0][0]
-        report_key = f"{user_id}/{latest_date}.json"
+        suffix = "" if granularity == "daily" else f".{granularity}"
+        report_key = f"{user_id}/{latest_date}{suffix}.json"
 
         s3 = get_s3_client()
 
         # 2. Check S3
         try:
-            s3.head_object(Bucket=S3_BUCKET, Key=report_key)
-            cdn_link = f"{CDN_URL}/{S3_BUCKET}/{report_key}"
-            return {"user_id": user_id, "report_url": cdn_link}
+            with track_dependency("s3", "head_object"):
+                head = s3.head_object(Bucket=S3_BUCKET, Key=report_key)
+            record_cache("s3_report", True)
+            version = head['ETag'].strip('"')
+            remember_version(user_id, granularity, report_key, version)
+            return report_response(user_id, report_key, version)
         except Exception:
-            pass
-
-        # 3. Generate from ClickHouse (Using VIEW)
-        result = ch_client.execute(
-            """
-            SELECT report_date, avg_signal, min_battery, total_actions
-            FROM bionicpro.user_daily_reports_view
-            WHERE user_id = %(user_id)s
-            ORDER BY report_date DESC
-            """,
-            {'user_id': user_id}
-        )
-
-        reports = []
-        for row in result:
-            reports.append({
-                "date": str(row[0]),
-                "avg_signal": row[1],
-                "min_battery": row[2],
-                "total_actions": row[3]
-            })
-
-        full_report = {"user_id": user_id, "reports": reports}
-
-        # 4. Upload to S3
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=report_key,
-            Body=json.dumps(full_report),
-            ContentType='application/json'
-        )
-
-        cdn_link = f"{CDN_URL}/{S3_BUCKET}/{report_key}"
-        return {"user_id": user_id, "report_url": cdn_link}
-
-    except Exception as e:
-        print(f"Error: {e}")
+            record_cache("s3_report", False)
+
+        # 3. Generate from ClickHouse (only this path is throttled, hits above are not)
+        with admission.admit(user_id):
+            if granularity == "daily":
+                full_report = build_daily_report(ch_client, user_id)
+            else:
+                full_report = {
+                    "user_id": user_id,
+                    "granularity": granularity,
+                    "reports": query_rollup(ch_client, user_id, granularity),
+                }
+            body = json.dumps(full_report).encode()
+            version = content_etag(body)
+
+            # 4. Upload to S3 (Content-MD5 makes S3 verify the hash it stores as ETag)
+            with track_dependency("s3", "put_object"):
+                s3.put_object(
+                    Bucket=S3_BUCKET,
+                    Key=report_key,
+                    Body=body,
+                    ContentType='application/json',
+                    ContentMD5=base64.b64encode(bytes.fromhex(version)).decode()
+                )
+
+        remember_version(user_id, granularity, report_key, version)
+        return report_response(user_id, report_key, version)
+
+    except AdmissionRejected as e:
+        return JSONResponse({"detail": f"Report generation throttled ({e.reason})"},
+                            status_code=e.status, headers={"Retry-After": str(e.retry_after)})
+    except Exception:
+        ERRORS.labels("get_user_report").inc()
+        logger.exception("Report for %s failed", user_id)
         raise HTTPException(status_code=500, detail="Error retrieving reports")
+
+@app.post("/internal/reports/{user_id}/invalidate", dependencies=[Depends(require_internal)])
+def invalidate_report_versions(user_id: str):
+    """Forget the user's remembered report versions (called by report-invalidator after deleting them)."""
+    for key in [key for key in report_versions if key[0] == user_id]:
+        report_versions.pop(key, None)
+    return {"user_id": user_id}
+
+@app.get("/internal/admission", dependencies=[Depends(require_internal)])
+def admission_stats():
+    """Current generation slots, queue depth and global bucket level."""
+    return admission.snapshot()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return metrics_response()
@@ -0,0 +1,98 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException, Request, Response
+from opentelemetry.trace import Status, StatusCode
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+from tracing import tracer
+
+# Shared secret for /internal/* routes (X-Internal-Token); unset = loopback only
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+# Buckets from sub-millisecond S3 HEADs up to cold ClickHouse scans
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_duration_seconds",
+    "Latency of calls to downstream dependencies",
+    ["dependency", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    "cache_events_total",
+    "Cache lookups by result",
+    ["cache", "result"],
+)
+ADMISSION_EVENTS = Counter(
+    "report_generation_admission_total",
+    "Report generation admission decisions (admitted or rejection reason)",
+    ["result"],
+)
+ERRORS = Counter(
+    "errors_total",
+    "Unhandled errors by place of origin",
+    ["where"],
+)
+
+
+@contextmanager
+def track_dependency(dependency, operation):
+    """
+    Time a block that talks to `dependency` and wrap it in a client span.
+    Exceptions are recorded as outcome=error. Yields the span.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    with tracer.start_as_current_span(f"{dependency} {operation}", record_exception=False) as span:
+        span.set_attribute("peer.service", dependency)
+        span.set_attribute("dependency.operation", operation)
+        try:
+            yield span
+        except Exception as e:
+            outcome = "error"
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR))
+            raise
+        finally:
+            DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(time.perf_counter() - started)
+
+
+def require_internal(request: Request):
+    """Dependency for /internal/* routes: valid X-Internal-Token, or loopback when no token is configured."""
+    if INTERNAL_API_TOKEN:
+        if hmac.compare_digest(request.headers.get("x-internal-token", ""), INTERNAL_API_TOKEN):
+            return
+    elif request.client and request.client.host in ("127.0.0.1", "::1"):
+        return
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def record_cache(cache, hit):
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(request.method, route_path, str(status)).observe(time.perf_counter() - started)
+
+
+def metrics_response():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
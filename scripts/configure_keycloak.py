@@ -1,201 +1,398 @@
+"""
+Declarative provisioning of reports-realm.
+
+The desired realm state (token lifespan, reports-frontend client, LDAP
+provider and role mapper, OTP in the browser flow, Yandex IdP) is compared
+with what Keycloak currently has and only the differences are written.
+Re-running against a configured realm makes no writes.
+
+Independent reads and writes go out concurrently over one pooled session.
+Readiness is polled with a short backoff instead of fixed sleeps.
+
+    python scripts/configure_keycloak.py [--dry-run] [--timeout 120]
+                                         [--ldap-profile cached] [--ldap-sync]
+
+LDAP federation settings come from a profile (LDAP_PROFILES). The profiles
+are compared by benchmarks/ldap_login_storm.py.
+"""
+import argparse
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import os
-import json
+from requests.adapters import HTTPAdapter
 
 KEYCLOAK_URL = os.getenv("KEYCLOAK_URL_INTERNAL", "http://localhost:8080")
 ADMIN_USER = "admin"
 ADMIN_PASS = "admin"
 REALM = "reports-realm"
 TOKEN_URL = f"{KEYCLOAK_URL}/realms/master/protocol/openid-connect/token"
+ADMIN_URL = f"{KEYCLOAK_URL}/admin/realms/{REALM}"
+STORAGE_PROVIDER = "org.keycloak.storage.UserStorageProvider"
+LDAP_MAPPER = "org.keycloak.storage.ldap.mappers.LDAPStorageMapper"
+# Keycloak returns stored secrets (bindCredential, IdP clientSecret) masked
+SECRET_VALUE = "**********"
+
+# --- Desired state ---
 
-def get_admin_token():
-    data = {
-        "username": ADMIN_USER,
-        "password": ADMIN_PASS,
-        "grant_type": "password",
-        "client_id": "admin-cli"
+# Task 3: Access Token Lifespan <= 2 min
+REALM_SETTINGS = {"accessTokenLifespan": 120}
+
+# Task 2 & 3: confidential client with PKCE
+CLIENT = {
+    "clientId": "reports-frontend",
+    "publicClient": False,
+    "standardFlowEnabled": True,
+    "directAccessGrantsEnabled": False,
+    "implicitFlowEnabled": False,
+    "clientAuthenticatorType": "client-secret",
+    "secret": "secret",
+    "redirectUris": ["http://localhost:8000/callback"],
+    "attributes": {
+        "pkce.code.challenge.method": "S256"
     }
-    r = requests.post(TOKEN_URL, data=data)
-    if r.status_code != 200:
-        print(f"Failed to get token: {r.status_code} {r.text}")
-    r.raise_for_status()
-    return r.json()["access_token"]
+}
 
-def main():
-    print(f"Connecting to Keycloak at {KEYCLOAK_URL}...")
-    token = None
-    for i in range(30):
-        try:
-            token = get_admin_token()
-            print("Connected!")
-            break
-        except Exception as e:
-            print(f"Waiting for Keycloak... ({e})")
-            time.sleep(2)
-
-    if not token:
-        print("Could not connect to Keycloak")
-        return
-
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-    # 0. Update Realm Settings (Task 3: Access Token Lifespan <= 2 min)
-    print("Updating Realm Token Lifespan to 120 seconds...")
-    realm_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}"
-    res = requests.put(realm_url, json={"accessTokenLifespan": 120}, headers=headers)
-    if res.status_code < 300:
-        print("Realm token lifespan updated.")
-    else:
-        print(f"Failed to update realm: {res.text}")
-
-    # 1. Update Client (Task 2 & 3 support)
-    print("Updating Client 'reports-frontend'...")
-    clients_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}/clients"
-    r = requests.get(clients_url, params={"clientId": "reports-frontend"}, headers=headers)
-    if r.status_code == 200 and len(r.json()) > 0:
-        client_data = r.json()[0]
-        client_id = client_data["id"]
-
-        update_data = client_data.copy()
-        update_data.update({
-            "publicClient": False,
-            "standardFlowEnabled": True,
-            "directAccessGrantsEnabled": False,
-            "implicitFlowEnabled": False,
-            "clientAuthenticatorType": "client-secret",
-            "secret": "secret",
-            "redirectUris": ["http://localhost:8000/callback"],
-            "attributes": {
-                "pkce.code.challenge.method": "S256"
-            }
-        })
+# Task 4: LDAP federation
+LDAP_PROVIDER = {
+    "name": "ldap-provider",
+    "providerId": "ldap",
+    "providerType": STORAGE_PROVIDER,
+    "parentId": REALM,
+    "config": {
+        "priority": ["0"],
+        "editMode": ["READ_ONLY"],
+        "syncRegistrations": ["false"],
+        "vendor": ["other"],
+        "usernameLDAPAttribute": ["uid"],
+        "rdnLDAPAttribute": ["uid"],
+        "uuidLDAPAttribute": ["entryUUID"],
+        "userObjectClasses": ["inetOrgPerson, organizationalPerson"],
+        "connectionUrl": ["ldap://ldap:389"],
+        "usersDn": ["ou=People,dc=example,dc=com"],
+        "authType": ["simple"],
+        "bindDn": ["cn=admin,dc=example,dc=com"],
+        "bindCredential": ["admin"],
+        "searchScope": ["1"],
+        "validatePasswordPolicy": ["false"],
+        "trustEmail": ["false"],
+        "useTruststoreSpi": ["ldapsOnly"],
+        "connectionPooling": ["true"]
+    }
+}
 
-        # Keycloak API sometimes complains if you send back read-only fields, but usually ignores them.
-        # Minimal update is safer if partial update supported, but Client update is usually full PUT.
+# Task 4: LDAP groups -> realm roles
+LDAP_MAPPERS = [
+    {
+        "name": "role-mapper",
+        "providerId": "role-ldap-mapper",
+        "providerType": LDAP_MAPPER,
+        "config": {
+            "roles.dn": ["ou=Groups,dc=example,dc=com"],
+            "role.name.ldap.attribute": ["cn"],
+            "role.object.classes": ["groupOfNames"],
+            "membership.ldap.attribute": ["member"],
+            "membership.attribute.type": ["DN"],
+            "membership.user.ldap.attribute": ["uid"],
+            "mode": ["READ_ONLY"],
+            "user.roles.retrieve.strategy": ["LOAD_ROLES_BY_MEMBER_ATTRIBUTE"],
+            "use.realm.roles.mapping": ["true"]
+        }
+    }
+]
 
-        res = requests.put(f"{clients_url}/{client_id}", json=update_data, headers=headers)
-        if res.status_code >= 200 and res.status_code < 300:
-            print("Client updated successfully.")
-        else:
-            print(f"Failed to update client: {res.status_code} {res.text}")
-    else:
-        print("Client 'reports-frontend' not found.")
-
-    # 2. Add LDAP (Task 4)
-    print("Adding LDAP Provider...")
-    components_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}/components"
-    r = requests.get(components_url, params={"parent": REALM, "type": "org.keycloak.storage.UserStorageProvider"}, headers=headers)
-
-    if not any(c.get('name') == 'ldap-provider' for c in r.json()):
-        ldap_data = {
-            "name": "ldap-provider",
-            "providerId": "ldap",
-            "providerType": "org.keycloak.storage.UserStorageProvider",
-            "parentId": REALM,
-            "config": {
-                "priority": ["0"],
-                "fullSyncPeriod": ["-1"],
-                "changedSyncPeriod": ["-1"],
-                "cachePolicy": ["DEFAULT"],
-                "batchSizeForSync": ["1000"],
-                "editMode": ["READ_ONLY"],
-                "syncRegistrations": ["false"],
-                "vendor": ["other"],
-                "usernameLDAPAttribute": ["uid"],
-                "rdnLDAPAttribute": ["uid"],
-                "uuidLDAPAttribute": ["entryUUID"],
-                "userObjectClasses": ["inetOrgPerson, organizationalPerson"],
-                "connectionUrl": ["ldap://ldap:389"],
-                "usersDn": ["ou=People,dc=example,dc=com"],
-                "authType": ["simple"],
-                "bindDn": ["cn=admin,dc=example,dc=com"],
-                "bindCredential": ["admin"],
-                "searchScope": ["1"],
-                "validatePasswordPolicy": ["false"],
-                "trustEmail": ["false"],
-                "useTruststoreSpi": ["ldapsOnly"],
-                "connectionPooling": ["true"]
-            }
+# Sync/caching profiles for the LDAP provider, applied on top of LDAP_PROVIDER:
+#   legacy  - no sync, DEFAULT cache: users are looked up in LDAP on first
+#             login and whenever the realm cache evicts them
+#   nocache - every login goes to LDAP (worst case, for comparison)
+#   cached  - users imported by a nightly full sync plus a periodic
+#             changed-users sync; cached entries (with their LDAP role
+#             mappings) live for `maxLifespan`, so a login storm is served
+#             from Keycloak's cache and DB instead of OpenLDAP
+# Periods are seconds, maxLifespan is milliseconds (Keycloak's units).
+LDAP_PROFILES = {
+    "legacy": {
+        "fullSyncPeriod": ["-1"],
+        "changedSyncPeriod": ["-1"],
+        "cachePolicy": ["DEFAULT"],
+        "batchSizeForSync": ["1000"],
+        "pagination": ["false"],
+    },
+    "nocache": {
+        "fullSyncPeriod": ["-1"],
+        "changedSyncPeriod": ["-1"],
+        "cachePolicy": ["NO_CACHE"],
+        "batchSizeForSync": ["1000"],
+        "pagination": ["false"],
+    },
+    "cached": {
+        "fullSyncPeriod": ["86400"],
+        "changedSyncPeriod": [os.getenv("LDAP_CHANGED_SYNC_PERIOD", "300")],
+        "cachePolicy": ["MAX_LIFESPAN"],
+        "maxLifespan": [os.getenv("LDAP_CACHE_LIFESPAN_MS", "3600000")],
+        "batchSizeForSync": ["500"],
+        # Paged search, so a sync never asks OpenLDAP for more than its size limit at once
+        "pagination": ["true"],
+        "connectionTimeout": ["5000"],
+        "readTimeout": ["10000"],
+    },
+}
+# Keycloak's defaults for the keys only some profiles set. Every profile is
+# applied on top of these, so switching profiles resets what the previous one
+# set (the stored component is merged, not replaced). -1 = no max lifespan,
+# "" = no LDAP timeout.
+LDAP_PROFILE_DEFAULTS = {
+    "maxLifespan": ["-1"],
+    "connectionTimeout": [""],
+    "readTimeout": [""],
+}
+assert all(key in LDAP_PROFILE_DEFAULTS or all(key in p for p in LDAP_PROFILES.values())
+           for profile in LDAP_PROFILES.values() for key in profile), "profile key without a default"
+
+LDAP_PROFILE = os.getenv("KEYCLOAK_LDAP_PROFILE", "cached")
+
+# Task 5: MFA (OTP) required in the browser flow
+BROWSER_FLOW = "browser"
+OTP_REQUIREMENT = {"auth-otp-form": "REQUIRED"}
+
+# Task 6: Yandex ID
+IDENTITY_PROVIDERS = [
+    {
+        "alias": "yandex",
+        "providerId": "yandex",
+        "enabled": True,
+        "config": {
+            "clientId": "placeholder_client_id",
+            "clientSecret": "placeholder_client_secret"
         }
-        res = requests.post(components_url, json=ldap_data, headers=headers)
-        if res.status_code >= 200 and res.status_code < 300:
-            print("LDAP Provider added.")
-            # Add Mapper? (Task 4: "Add mapping of roles")
-            # We need the ID of the component we just created.
-            # Reread components
-            r_new = requests.get(components_url, params={"parent": REALM, "type": "org.keycloak.storage.UserStorageProvider"}, headers=headers)
-            ldap_comp = next((c for c in r_new.json() if c['name'] == 'ldap-provider'), None)
-            if ldap_comp:
-                ldap_id = ldap_comp['id']
-                # Create role mapper
-                # Endpoint: POST /admin/realms/{realm}/components
-                # Mapper type: org.keycloak.storage.ldap.mappers.LDAPStorageMapper
-                mapper_data = {
-                    "name": "role-mapper",
-                    "providerId": "role-ldap-mapper",
-                    "providerType": "org.keycloak.storage.ldap.mappers.LDAPStorageMapper",
-                    "parentId": ldap_id,
-                    "config": {
-                        "roles.dn": ["ou=Groups,dc=example,dc=com"],
-                        "role.name.ldap.attribute": ["cn"],
-                        "role.object.classes": ["groupOfNames"],
-                        "membership.ldap.attribute": ["member"],
-                        "membership.attribute.type": ["DN"],
-                        "membership.user.ldap.attribute": ["uid"],
-                        "mode": ["READ_ONLY"],
-                        "user.roles.retrieve.strategy": ["LOAD_ROLES_BY_MEMBER_ATTRIBUTE"],
-                        "use.realm.roles.mapping": ["true"]
-                    }
-                }
-                res_map = requests.post(components_url, json=mapper_data, headers=headers)
-                if res_map.status_code < 300:
-                    print("LDAP Role Mapper added.")
-                else:
-                    print(f"Failed to add mapper: {res_map.text}")
+    }
+]
+
+
+def changes(current, desired):
+    """Part of `desired` that differs from `current` (nested dicts compared key by key)."""
+    diff = {}
+    for key, value in desired.items():
+        if current.get(key) in (SECRET_VALUE, [SECRET_VALUE]):
+            continue  # masked, cannot be compared
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            nested = changes(current[key], value)
+            if nested:
+                diff[key] = nested
+        elif current.get(key) != value:
+            diff[key] = value
+    return diff
 
+
+def merged(current, diff):
+    """Full representation for PUT endpoints: current state with the diff applied."""
+    result = dict(current)
+    for key, value in diff.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merged(result[key], value)
         else:
-             print(f"Failed to add LDAP: {res.text}")
-    else:
-        print("LDAP Provider already exists.")
-
-    # 3. MFA (Task 5)
-    print("Configuring MFA (OTP) as REQUIRED...")
-    flows_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}/authentication/flows/browser/executions"
-    r = requests.get(flows_url, headers=headers)
-    if r.status_code == 200:
-        for exe in r.json():
-            if exe.get("providerId") == "auth-otp-form":
-                exe_id = exe["id"]
-                print(f"Found OTP execution: {exe_id}")
-                req_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}/authentication/executions/{exe_id}/requirement"
-                res = requests.put(req_url, json={"requirement": "REQUIRED"}, headers=headers)
-                if res.status_code < 300:
-                    print("MFA set to REQUIRED.")
-                else:
-                    print(f"Failed to set MFA: {res.text}")
-
-    # 4. Yandex ID (Task 6)
-    print("Adding Yandex ID...")
-    idp_url = f"{KEYCLOAK_URL}/admin/realms/{REALM}/identity-provider/instances"
-    r = requests.get(idp_url, headers=headers)
-    if not any(i.get('alias') == 'yandex' for i in r.json()):
-        yandex_data = {
-            "alias": "yandex",
-            "providerId": "yandex",
-            "enabled": True,
-            "config": {
-                "clientId": "placeholder_client_id",
-                "clientSecret": "placeholder_client_secret"
-            }
-        }
-        res = requests.post(idp_url, json=yandex_data, headers=headers)
-        if res.status_code < 300:
-            print("Yandex IDP added.")
+            result[key] = value
+    return result
+
+
+class Admin:
+    """Keycloak admin API over one keep-alive session shared by worker threads."""
+
+    def __init__(self, dry_run=False, pool_size=8):
+        self.dry_run = dry_run
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.writes = 0
+
+    def login(self):
+        r = self.session.post(TOKEN_URL, data={
+            "username": ADMIN_USER,
+            "password": ADMIN_PASS,
+            "grant_type": "password",
+            "client_id": "admin-cli"
+        })
+        if r.status_code != 200:
+            print(f"Failed to get token: {r.status_code} {r.text}")
+        r.raise_for_status()
+        self.session.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+
+    def get(self, path, **params):
+        r = self.session.get(f"{ADMIN_URL}{path}", params=params or None)
+        r.raise_for_status()
+        return r.json()
+
+    def write(self, method, path, body, what):
+        self.writes += 1
+        if self.dry_run:
+            print(f"[dry-run] {method} {path}: {what}")
+            return None
+        r = self.session.request(method, f"{ADMIN_URL}{path}", json=body)
+        if r.status_code >= 300:
+            raise RuntimeError(f"{what} failed: {r.status_code} {r.text}")
+        print(f"{what}: done")
+        return r
+
+
+def wait_ready(session, timeout):
+    """Keycloak is ready once the realm (imported at startup) serves its discovery document."""
+    url = f"{KEYCLOAK_URL}/realms/{REALM}/.well-known/openid-configuration"
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            if session.get(url, timeout=2).status_code == 200:
+                return
+            reason = "realm not imported yet"
+        except requests.RequestException as e:
+            reason = type(e).__name__
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Keycloak not ready after {timeout}s ({reason})")
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+# --- Reconcilers: read current state, write only the difference ---
+
+def reconcile_realm(admin):
+    diff = changes(admin.get(""), REALM_SETTINGS)
+    if not diff:
+        return "realm: up to date"
+    admin.write("PUT", "", diff, f"realm: update {sorted(diff)}")
+    return "realm: updated"
+
+
+def reconcile_client(admin):
+    found = admin.get("/clients", clientId=CLIENT["clientId"])
+    if not found:
+        admin.write("POST", "/clients", CLIENT, f"client {CLIENT['clientId']}: create")
+        return "client: created"
+    diff = changes(found[0], CLIENT)
+    if not diff:
+        return "client: up to date"
+    admin.write("PUT", f"/clients/{found[0]['id']}", merged(found[0], diff),
+                f"client {CLIENT['clientId']}: update {sorted(diff)}")
+    return "client: updated"
+
+
+def reconcile_component(admin, existing, desired, parent_id):
+    desired = dict(desired, parentId=parent_id)
+    current = next((c for c in existing if c.get("name") == desired["name"]), None)
+    if current is None:
+        r = admin.write("POST", "/components", desired, f"component {desired['name']}: create")
+        # The id of the new component is in the Location header, no re-read needed
+        return r.headers["Location"].rsplit("/", 1)[-1] if r is not None else None
+    diff = changes(current, desired)
+    if diff:
+        admin.write("PUT", f"/components/{current['id']}", merged(current, diff),
+                    f"component {desired['name']}: update {sorted(diff.get('config', diff))}")
+    return current["id"]
+
+
+def ldap_provider(profile):
+    provider = dict(LDAP_PROVIDER)
+    provider["config"] = {**LDAP_PROVIDER["config"], **LDAP_PROFILE_DEFAULTS, **LDAP_PROFILES[profile]}
+    return provider
+
+
+def reconcile_ldap(admin, pool, profile=LDAP_PROFILE):
+    """Returns the id of the LDAP provider (None on a dry run that would create it)."""
+    providers = admin.get("/components", parent=REALM, type=STORAGE_PROVIDER)
+    ldap_id = reconcile_component(admin, providers, ldap_provider(profile), REALM)
+    if ldap_id is None:
+        # dry run of a fresh realm: the mappers would all be created
+        for mapper in LDAP_MAPPERS:
+            admin.write("POST", "/components", mapper, f"component {mapper['name']}: create")
+        return None
+    mappers = admin.get("/components", parent=ldap_id, type=LDAP_MAPPER)
+    list(pool.map(lambda m: reconcile_component(admin, mappers, m, ldap_id), LDAP_MAPPERS))
+    return ldap_id
+
+
+def sync_ldap(admin, ldap_id, action="triggerFullSync"):
+    """Import LDAP users now instead of waiting for the next sync period."""
+    r = admin.write("POST", f"/user-storage/{ldap_id}/sync?action={action}", None, f"ldap: {action}")
+    return r.json() if r is not None else {}
+
+
+def reconcile_otp(admin):
+    path = f"/authentication/flows/{BROWSER_FLOW}/executions"
+    updated = 0
+    for execution in admin.get(path):
+        wanted = OTP_REQUIREMENT.get(execution.get("providerId"))
+        if wanted and execution.get("requirement") != wanted:
+            admin.write("PUT", path, dict(execution, requirement=wanted),
+                        f"execution {execution['providerId']}: requirement {wanted}")
+            updated += 1
+    return f"otp: {'updated' if updated else 'up to date'}"
+
+
+def reconcile_idps(admin):
+    existing = {i["alias"]: i for i in admin.get("/identity-provider/instances")}
+    result = []
+    for idp in IDENTITY_PROVIDERS:
+        current = existing.get(idp["alias"])
+        if current is None:
+            admin.write("POST", "/identity-provider/instances", idp, f"idp {idp['alias']}: create")
+            result.append(f"{idp['alias']} created")
+            continue
+        diff = changes(current, idp)
+        if diff:
+            admin.write("PUT", f"/identity-provider/instances/{idp['alias']}", merged(current, diff),
+                        f"idp {idp['alias']}: update {sorted(diff)}")
+            result.append(f"{idp['alias']} updated")
         else:
-            print(f"Failed to add Yandex IDP: {res.text}")
-    else:
-        print("Yandex IDP already exists.")
+            result.append(f"{idp['alias']} up to date")
+    return f"idp: {', '.join(result)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="print the writes that would be made")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for Keycloak")
+    parser.add_argument("--ldap-profile", choices=sorted(LDAP_PROFILES), default=LDAP_PROFILE)
+    parser.add_argument("--ldap-sync", action="store_true", help="run a full LDAP sync after provisioning")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    admin = Admin(dry_run=args.dry_run)
+    print(f"Waiting for Keycloak at {KEYCLOAK_URL}...")
+    wait_ready(admin.session, args.timeout)
+    admin.login()
+    print(f"Connected in {time.perf_counter() - started:.1f}s")
+
+    # The resources are independent of each other; the LDAP mappers wait on
+    # their provider inside reconcile_ldap
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [
+            pool.submit(reconcile_realm, admin),
+            pool.submit(reconcile_client, admin),
+            pool.submit(reconcile_ldap, admin, pool, args.ldap_profile),
+            pool.submit(reconcile_otp, admin),
+            pool.submit(reconcile_idps, admin),
+        ]
+        failed = False
+        for name, future in zip(("realm", "client", "ldap", "otp", "idp"), futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed = True
+                print(f"Failed: {e}")
+                continue
+            if name == "ldap":
+                print(f"ldap: reconciled (profile {args.ldap_profile})")
+                if args.ldap_sync and result:
+                    print(f"ldap: {sync_ldap(admin, result)}")
+            else:
+                print(result)
+
+    print(f"{admin.writes} write(s){' planned' if args.dry_run else ''} "
+          f"in {time.perf_counter() - started:.1f}s")
+    if failed:
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     main()
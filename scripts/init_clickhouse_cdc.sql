@@ -41,7 +41,10 @@ CREATE TABLE IF NOT EXISTS bionicpro.telemetry_raw (
     avg_signal Float32,
     min_battery Int32,
     total_actions Int32
+    -- Weekly/monthly rollup projections and their views: dags/rollups.py,
+    -- applied right after this script by scripts/init_db.sh and by the ETL
 ) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(log_date)
 ORDER BY (user_id, log_date);
 
 -- 5. Reporting View (The "Showcase")
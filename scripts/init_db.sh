@@ -3,6 +3,8 @@ set -e
 
 echo "Running SQL initialization for ClickHouse..."
 cat scripts/init_clickhouse_cdc.sql | docker-compose exec -T clickhouse clickhouse-client
+# Weekly/monthly rollup projections and views (defined in dags/rollups.py, also applied by the ETL)
+python3 dags/rollups.py | docker-compose exec -T clickhouse clickhouse-client --multiquery
 
 echo "Seeding Postgres Data (Mock CRM/Telemetry)..."
 # We need to run the python script inside a container that has psycopg2.
@@ -31,8 +33,19 @@ CREATE TABLE IF NOT EXISTS crm_users (
     name VARCHAR(100),
     email VARCHAR(100),
     contract_date DATE,
-    model VARCHAR(50)
+    model VARCHAR(50),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS crm_users_updated_at_idx ON crm_users (updated_at);
+CREATE OR REPLACE FUNCTION crm_users_touch() RETURNS trigger AS \$\$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+\$\$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS crm_users_touch ON crm_users;
+CREATE TRIGGER crm_users_touch BEFORE UPDATE ON crm_users
+    FOR EACH ROW EXECUTE FUNCTION crm_users_touch();
 CREATE TABLE IF NOT EXISTS telemetry_logs (
     id SERIAL PRIMARY KEY,
     user_id VARCHAR(50),
@@ -41,6 +54,10 @@ CREATE TABLE IF NOT EXISTS telemetry_logs (
     battery_level INT,
     action VARCHAR(50)
 );
+ALTER TABLE telemetry_logs ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMP NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS telemetry_logs_timestamp_brin ON telemetry_logs USING brin (timestamp);
+CREATE INDEX IF NOT EXISTS telemetry_logs_user_timestamp_idx ON telemetry_logs (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS telemetry_logs_ingested_at_brin ON telemetry_logs USING brin (ingested_at);
 "
 
 echo "Inserting Mock Data..."
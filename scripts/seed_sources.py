@@ -1,7 +1,11 @@
 import psycopg2
+from psycopg2.extras import execute_values
+import argparse
 import os
 import random
+import time
 from datetime import datetime, timedelta
+from multiprocessing import Pool
 
 # Configuration (matching docker-compose)
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -9,6 +13,12 @@ DB_PORT = os.getenv("DB_PORT", "5434")
 DB_NAME = os.getenv("DB_NAME", "source_db")
 DB_USER = os.getenv("DB_USER", "user")
 DB_PASS = os.getenv("DB_PASS", "password")
+CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "localhost")
+CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", 9000))
+
+ACTIONS = ["grip", "release", "rotate_left", "rotate_right", "idle"]
+MODELS = ["Hand-X1", "Leg-Y2", "Hand-Z3"]
+TELEMETRY_COLUMNS = ("user_id", "timestamp", "signal_strength", "battery_level", "action")
 
 def get_connection():
     return psycopg2.connect(
@@ -19,8 +29,7 @@ def get_connection():
         password=DB_PASS
     )
 
-def seed_crm(cursor):
-    print("Seeding CRM data...")
+def create_tables(cursor, partitioned=False):
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS crm_users (
             id VARCHAR(50) PRIMARY KEY,
@@ -30,68 +39,310 @@ def seed_crm(cursor):
             model VARCHAR(50)
         );
     """)
+    # Change timestamp for incremental CRM extraction (watermark in the ETL)
+    cursor.execute("""
+        ALTER TABLE crm_users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+        CREATE INDEX IF NOT EXISTS crm_users_updated_at_idx ON crm_users (updated_at);
+        CREATE OR REPLACE FUNCTION crm_users_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS crm_users_touch ON crm_users;
+        CREATE TRIGGER crm_users_touch BEFORE UPDATE ON crm_users
+            FOR EACH ROW EXECUTE FUNCTION crm_users_touch();
+    """)
+    if partitioned:
+        # Monthly range partitions; the partition key must be part of the PK
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS telemetry_logs (
+                id BIGSERIAL,
+                user_id VARCHAR(50),
+                timestamp TIMESTAMP NOT NULL,
+                signal_strength INT,
+                battery_level INT,
+                action VARCHAR(50),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp);
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS telemetry_logs (
+                id SERIAL PRIMARY KEY,
+                user_id VARCHAR(50),
+                timestamp TIMESTAMP,
+                signal_strength INT,
+                battery_level INT,
+                action VARCHAR(50)
+            );
+        """)
+    # Arrival time, used by the ETL to find late events for already processed days
+    cursor.execute("ALTER TABLE telemetry_logs ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMP NOT NULL DEFAULT now()")
+
+def create_partitions(cursor, start_date, end_date):
+    """Create monthly partitions covering [start_date, end_date] if telemetry_logs is partitioned."""
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'telemetry_logs'::regclass")
+    if not cursor.fetchone():
+        return
+    month = start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= end_date:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS telemetry_logs_{month:%Y_%m} PARTITION OF telemetry_logs "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        )
+        month = next_month
+
+def create_telemetry_indexes(cursor):
+    """
+    Indexes for the ETL extract: BRIN for time-window and arrival scans (rows
+    arrive in time order) and B-tree for per-user ranges. Built after bulk load.
+    """
+    print("Creating telemetry indexes...")
+    cursor.execute("CREATE INDEX IF NOT EXISTS telemetry_logs_timestamp_brin ON telemetry_logs USING brin (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS telemetry_logs_user_timestamp_idx ON telemetry_logs (user_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS telemetry_logs_ingested_at_brin ON telemetry_logs USING brin (ingested_at)")
+    cursor.execute("ANALYZE telemetry_logs")
 
-    users = [
-        ("user1", "User One", "user1@example.com", "2023-01-15", "Hand-X1"),
-        ("user2", "User Two", "user2@example.com", "2023-02-20", "Leg-Y2"),
-        ("admin1", "Admin One", "admin1@example.com", "2023-03-01", "Hand-Z3")
+def generated_crm_users(user_ids):
+    return [
+        (uid, f"User {uid}", f"{uid}@example.com", "2023-01-15", MODELS[i % len(MODELS)])
+        for i, uid in enumerate(user_ids)
     ]
 
-    for uid, name, email, date, model in users:
-        cursor.execute(
-            "INSERT INTO crm_users (id, name, email, contract_date, model) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (id) DO NOTHING",
-            (uid, name, email, date, model)
+def seed_crm(cursor, users=None):
+    print("Seeding CRM data...")
+    create_tables(cursor)
+
+    if users is None:
+        users = [
+            ("user1", "User One", "user1@example.com", "2023-01-15", "Hand-X1"),
+            ("user2", "User Two", "user2@example.com", "2023-02-20", "Leg-Y2"),
+            ("admin1", "Admin One", "admin1@example.com", "2023-03-01", "Hand-Z3")
+        ]
+
+    execute_values(
+        cursor,
+        "INSERT INTO crm_users (id, name, email, contract_date, model) VALUES %s ON CONFLICT (id) DO NOTHING",
+        users,
+        page_size=1000
+    )
+
+def generate_events(user_ids, start_date, days, events_per_hour, seed):
+    """
+    Yield telemetry rows for the given users, hour by hour, so rows land on
+    disk in time order like real telemetry (keeps the BRIN index selective).
+    Every user has its own RNG, so output does not depend on how users are
+    split between workers.
+    """
+    rngs = [(uid, random.Random(f"{seed}:{uid}")) for uid in user_ids]
+    min_events, max_events = events_per_hour
+    for hour in range(days * 24):
+        hour_start = start_date + timedelta(hours=hour)
+        # Drains over days, recharged every 10 days
+        battery = 100 - ((hour // 24) % 10) * 10
+        for uid, rng in rngs:
+            for _ in range(rng.randint(min_events, max_events)):
+                yield (
+                    uid,
+                    hour_start + timedelta(seconds=rng.randrange(3600)),
+                    rng.randint(50, 100),
+                    battery,
+                    ACTIONS[rng.randrange(len(ACTIONS))],
+                )
+
+class CopyStream:
+    """File-like adapter feeding generated rows to COPY FROM STDIN as tab-separated text."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        chunk = []
+        length = len(self.buffer)
+        if self.buffer:
+            chunk.append(self.buffer)
+        for row in self.rows:
+            line = "\t".join(str(v) for v in row) + "\n"
+            chunk.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 < size <= length:
+                break
+        data = "".join(chunk)
+        if 0 < size < len(data):
+            data, self.buffer = data[:size], data[size:]
+        else:
+            self.buffer = ""
+        return data
+
+    readline = read
+
+def insert_telemetry(cursor, rows, method="copy", batch_size=10000):
+    """Bulk-load rows; returns the number of rows written."""
+    if method == "copy":
+        stream = CopyStream(rows)
+        cursor.copy_expert(
+            f"COPY telemetry_logs ({', '.join(TELEMETRY_COLUMNS)}) FROM STDIN",
+            stream,
+            size=1 << 20
         )
+        return stream.count
+
+    count = 0
+    batch = []
+    sql = f"INSERT INTO telemetry_logs ({', '.join(TELEMETRY_COLUMNS)}) VALUES %s"
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            execute_values(cursor, sql, batch, page_size=batch_size)
+            count += len(batch)
+            batch = []
+    if batch:
+        execute_values(cursor, sql, batch, page_size=batch_size)
+        count += len(batch)
+    return count
 
-def seed_telemetry(cursor):
+def seed_telemetry(cursor, user_ids=None, days=7, events_per_hour=(5, 10), seed=42, method="copy",
+                   start_date=None):
     print("Seeding Telemetry data...")
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS telemetry_logs (
-            id SERIAL PRIMARY KEY,
-            user_id VARCHAR(50),
-            timestamp TIMESTAMP,
-            signal_strength INT,
-            battery_level INT,
-            action VARCHAR(50)
-        );
-    """)
+    create_tables(cursor)
 
-    user_ids = ["user1", "user2"]
-    actions = ["grip", "release", "rotate_left", "rotate_right", "idle"]
-
-    # Generate data for last 7 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=7)
-
-    # Simple batch insert logic
-    current = start_date
-    while current < end_date:
-        for uid in user_ids:
-            # 5-10 logs per hour per user
-            for _ in range(random.randint(5, 10)):
-                log_time = current + timedelta(minutes=random.randint(0, 59))
-                signal = random.randint(50, 100)
-                battery = max(0, 100 - (log_time - start_date).days * 10) # Drains over days
-                action = random.choice(actions)
-
-                cursor.execute(
-                    "INSERT INTO telemetry_logs (user_id, timestamp, signal_strength, battery_level, action) VALUES (%s, %s, %s, %s, %s)",
-                    (uid, log_time, signal, battery, action)
-                )
-        current += timedelta(hours=1)
+    if user_ids is None:
+        user_ids = ["user1", "user2"]
+    if start_date is None:
+        start_date = (datetime.now() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+
+    create_partitions(cursor, start_date, start_date + timedelta(days=days))
+    return insert_telemetry(cursor, generate_events(user_ids, start_date, days, events_per_hour, seed), method)
+
+def daily_rollups(events):
+    """Same aggregation as the ETL extract: per (user_id, day) avg/min/count."""
+    current_key = None
+    signal_sum = count = 0
+    min_battery = None
+    for user_id, ts, signal, battery, _ in events:
+        key = (user_id, ts.date())
+        if key != current_key:
+            if current_key is not None:
+                yield (current_key[0], current_key[1], signal_sum / count, min_battery, count)
+            current_key, signal_sum, count, min_battery = key, 0, 0, battery
+        signal_sum += signal
+        count += 1
+        min_battery = min(min_battery, battery)
+    if current_key is not None:
+        yield (current_key[0], current_key[1], signal_sum / count, min_battery, count)
+
+def seed_clickhouse_rollups(user_ids, start_date, days, events_per_hour, seed, batch_size=100000):
+    """Write daily rollups straight into bionicpro.telemetry_raw (skips the ETL)."""
+    from clickhouse_driver import Client
+
+    client = Client(host=CLICKHOUSE_HOST, port=CLICKHOUSE_PORT)
+    batch = []
+    total = 0
+    for uid in user_ids:
+        # One user's events come hour by hour, so they are already grouped by day
+        batch.extend(daily_rollups(generate_events([uid], start_date, days, events_per_hour, seed)))
+        if len(batch) >= batch_size:
+            client.execute("INSERT INTO bionicpro.telemetry_raw (user_id, log_date, avg_signal, min_battery, total_actions) VALUES", batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        client.execute("INSERT INTO bionicpro.telemetry_raw (user_id, log_date, avg_signal, min_battery, total_actions) VALUES", batch)
+        total += len(batch)
+    return total
+
+def _seed_worker(job):
+    """Process-pool entry point: one connection and one COPY per user chunk."""
+    user_ids, opts = job
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    rows = 0
+    if not opts["skip_postgres"]:
+        rows = insert_telemetry(
+            cursor,
+            generate_events(user_ids, opts["start_date"], opts["days"], opts["events_per_hour"], opts["seed"]),
+            opts["method"],
+            opts["batch_size"]
+        )
+    cursor.close()
+    conn.close()
+    rollups = 0
+    if opts["clickhouse"]:
+        rollups = seed_clickhouse_rollups(user_ids, opts["start_date"], opts["days"], opts["events_per_hour"], opts["seed"])
+    return rows, rollups
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed CRM and telemetry source data")
+    parser.add_argument("--users", type=int, help="generate user1..userN (default: user1, user2)")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--min-events-per-hour", type=int, default=5)
+    parser.add_argument("--max-events-per-hour", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed; same seed -> same data")
+    parser.add_argument("--method", choices=["copy", "execute_values"], default="copy")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows per execute_values batch")
+    parser.add_argument("--workers", type=int, default=1, help="parallel loader processes")
+    parser.add_argument("--clickhouse", action="store_true", help="also write daily rollups to ClickHouse telemetry_raw")
+    parser.add_argument("--skip-postgres", action="store_true", help="do not write telemetry_logs")
+    parser.add_argument("--partitioned", action="store_true", help="create telemetry_logs with monthly partitions (new table only)")
+    parser.add_argument("--no-indexes", action="store_true", help="skip creating telemetry indexes after the load")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.users:
+        user_ids = [f"user{i}" for i in range(1, args.users + 1)]
+        crm_users = generated_crm_users(user_ids)
+    else:
+        user_ids = ["user1", "user2"]
+        crm_users = None
+
     try:
         conn = get_connection()
         conn.autocommit = True
         cursor = conn.cursor()
+        create_tables(cursor, partitioned=args.partitioned)
+        seed_crm(cursor, crm_users)
 
-        seed_crm(cursor)
-        seed_telemetry(cursor)
+        print("Seeding Telemetry data...")
+        start_date = (datetime.now() - timedelta(days=args.days)).replace(minute=0, second=0, microsecond=0)
+        create_partitions(cursor, start_date, start_date + timedelta(days=args.days))
+        opts = {
+            "start_date": start_date,
+            "days": args.days,
+            "events_per_hour": (args.min_events_per_hour, args.max_events_per_hour),
+            "seed": args.seed,
+            "method": args.method,
+            "batch_size": args.batch_size,
+            "clickhouse": args.clickhouse,
+            "skip_postgres": args.skip_postgres,
+        }
+        workers = max(1, min(args.workers, len(user_ids)))
+        chunks = [user_ids[i::workers] for i in range(workers)]
 
-        print("Seeding complete.")
+        started = time.perf_counter()
+        if workers == 1:
+            results = [_seed_worker((chunks[0], opts))]
+        else:
+            with Pool(workers) as pool:
+                results = pool.map(_seed_worker, [(chunk, opts) for chunk in chunks])
+        elapsed = time.perf_counter() - started
+
+        if not args.skip_postgres and not args.no_indexes:
+            create_telemetry_indexes(cursor)
         cursor.close()
         conn.close()
+
+        rows = sum(r[0] for r in results)
+        rollups = sum(r[1] for r in results)
+        print(f"Telemetry rows: {rows} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+        if args.clickhouse:
+            print(f"ClickHouse daily rollups: {rollups}")
+        print("Seeding complete.")
     except Exception as e:
         print(f"Error seeding data: {e}")
 
@@ -10,13 +10,18 @@ echo "Getting CDN URL..."
 RESPONSE=$(curl -s http://localhost:8001/reports/user1)
 echo "API Response: $RESPONSE"
 
-URL=$(echo "$RESPONSE" | grep -o '"report_url": *"[^"]*"' | cut -d'"' -f4)
+REPORT_PATH=$(echo "$RESPONSE" | grep -o '"report_path": *"[^"]*"' | cut -d'"' -f4)
+REPORT_VERSION=$(echo "$RESPONSE" | grep -o '"report_version": *"[^"]*"' | cut -d'"' -f4)
 
-if [ -z "$URL" ]; then
-    echo "FAIL: No report_url found in response."
+if [ -z "$REPORT_PATH" ]; then
+    echo "FAIL: No report_path found in response."
     exit 1
 fi
 
+# reports-service does not sign links; sign the way the BFF does (same CDN_SIGNING_SECRET)
+URL=$(python3 -c 'import sys; sys.path.insert(0, sys.argv[1]); from cdn_links import sign_cdn_path; print(sign_cdn_path(sys.argv[2], sys.argv[3]))' \
+    "$(dirname "$0")/../bionicpro-auth" "$REPORT_PATH" "$REPORT_VERSION")
+
 echo "Found CDN URL: $URL"
 
 # 3. Fetch from CDN
@@ -29,3 +34,25 @@ else
     echo "FAIL: Could not fetch from CDN (Status: $CDN_STATUS)."
     echo "Note: Ensure Nginx is running on port 9090."
 fi
+
+# 4. Unchanged reports are revalidated with a 304
+ETAG=$(curl -s -D - -o /dev/null "$URL" | grep -i '^etag:' | cut -d' ' -f2 | tr -d '\r')
+echo "CDN ETag: $ETAG"
+REVALIDATE_STATUS=$(curl -s -o /dev/null -w "%{http_code}" -H "If-None-Match: $ETAG" "$URL")
+
+if [ "$REVALIDATE_STATUS" == "304" ]; then
+    echo "SUCCESS: CDN answers If-None-Match with 304."
+else
+    echo "FAIL: CDN revalidation returned $REVALIDATE_STATUS (expected 304)."
+fi
+
+# 5. Unsigned links must be rejected by the CDN
+UNSIGNED_URL="${URL%%\?*}"
+echo "Fetching unsigned URL: $UNSIGNED_URL"
+UNSIGNED_STATUS=$(curl -s -o /dev/null -w "%{http_code}" "$UNSIGNED_URL")
+
+if [ "$UNSIGNED_STATUS" == "403" ]; then
+    echo "SUCCESS: Unsigned CDN access is denied."
+else
+    echo "FAIL: Unsigned CDN access returned $UNSIGNED_STATUS (expected 403)."
+fi